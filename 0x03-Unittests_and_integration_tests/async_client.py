@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""An asyncio github org client for auditing many orgs at once
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from requests.structures import CaseInsensitiveDict
+
+from client import GithubOrgClient
+from utils import (
+    get_json_response,
+    parse_links,
+)
+
+
+class AdaptiveTokenBucket:
+    """Token bucket whose refill rate follows the server's rate limit.
+    Every response's X-RateLimit-Remaining/Reset headers re-spread the
+    remaining budget evenly over the time left in the window, keeping a
+    reserve, so requests slow down well before the limit is reached
+    instead of failing once it is.
+    """
+
+    def __init__(self, rate: float = 10.0, capacity: float = 10.0,
+                 reserve: float = 0.1, min_rate: float = 0.05) -> None:
+        """Init method of AdaptiveTokenBucket
+        Parameters
+        ----------
+        rate: float
+            requests per second until the server reports its limit
+        capacity: float
+            largest burst allowed
+        reserve: float
+            fraction of X-RateLimit-Limit never spent
+        min_rate: float
+            floor for the refill rate while budget remains
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = reserve
+        self.min_rate = min_rate
+        self.tokens = capacity
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        """Add the tokens earned since the last refill."""
+        now = time.monotonic()
+        if now > self.paused_until:
+            start = max(self._updated, self.paused_until)
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - start) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent, then spend one token."""
+        async with self._lock:
+            while True:
+                self._refill()
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def update(self, headers: Mapping) -> None:
+        """Adapt the rate to the X-RateLimit-* headers of a response."""
+        headers = CaseInsensitiveDict(headers)
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset_at = float(headers["X-RateLimit-Reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        limit = int(headers.get("X-RateLimit-Limit") or 0)
+        self._refill()
+        window = max(reset_at - time.time(), 1.0)
+        usable = remaining - int(limit * self.reserve)
+        if usable <= 0:
+            # budget spent: hold everything until the window resets
+            self.tokens = 0.0
+            self.paused_until = time.monotonic() + window
+            return
+        self.rate = max(usable / window, self.min_rate)
+        self.tokens = min(self.tokens, float(usable))
+
+
+class RequestScheduler:
+    """Runs every HTTP request of the async clients.
+    Requests share a global concurrency cap and one adaptive token
+    bucket; the blocking fetch itself runs on a thread pool so the shared
+    keep-alive session and conditional cache of utils are reused. The
+    bucket follows the headers of the response actually received, also
+    for a 304; error statuses raise requests.HTTPError.
+    """
+
+    def __init__(self, concurrency: int = 16,
+                 bucket: Optional[AdaptiveTokenBucket] = None) -> None:
+        """Init method of RequestScheduler"""
+        self.concurrency = concurrency
+        self.bucket = bucket or AdaptiveTokenBucket()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="github-fetch")
+
+    async def fetch(self, url: str) -> Tuple[Any, Mapping]:
+        """JSON payload and headers of url, within the limits."""
+        async with self._semaphore:
+            await self.bucket.acquire()
+            loop = asyncio.get_running_loop()
+            payload, headers, response = await loop.run_in_executor(
+                self._executor, get_json_response, url)
+        self.bucket.update(response.headers)
+        response.raise_for_status()
+        return payload, headers
+
+    def close(self) -> None:
+        """Stop the fetch threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self) -> "RequestScheduler":
+        """Async context manager entry"""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Async context manager exit"""
+        self.close()
+
+
+class AsyncGithubOrgClient:
+    """An asyncio Github org client
+    Same surface as GithubOrgClient, with coroutine methods:
+    ``await client.org()``, ``await client.repos_payload()`` and
+    ``await client.public_repos(license)``.
+    """
+    ORG_URL = GithubOrgClient.ORG_URL
+
+    def __init__(self, org_name: str, scheduler: RequestScheduler) -> None:
+        """Init method of AsyncGithubOrgClient"""
+        self._org_name = org_name
+        self._scheduler = scheduler
+        self._cache: Dict[str, "asyncio.Task"] = {}
+
+    def _memoized(self, name: str, coro_fn) -> "asyncio.Future":
+        """Share one in-flight or successful task per method; a failed
+        one is dropped so that the next call tries again
+        """
+        task = self._cache.get(name)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._cache[name] = task
+            task.add_done_callback(
+                lambda done: self._forget_failed(name, done))
+        return asyncio.shield(task)
+
+    def _forget_failed(self, name: str, task: "asyncio.Task") -> None:
+        """Drop task from the memo if it did not succeed"""
+        if (task.cancelled() or task.exception() is not None) \
+                and self._cache.get(name) is task:
+            del self._cache[name]
+
+    async def org(self) -> Dict:
+        """Memoize org"""
+        async def fetch() -> Dict:
+            payload, _ = await self._scheduler.fetch(
+                self.ORG_URL.format(org=self._org_name))
+            return payload
+        return await self._memoized("org", fetch)
+
+    async def _public_repos_url(self) -> str:
+        """Public repos URL"""
+        return (await self.org())["repos_url"]
+
+    async def repos_payload(self) -> List[Dict]:
+        """Memoize repos payload, every page of it"""
+        return await self._memoized("repos_payload", self._fetch_repos)
+
+    async def _fetch_repos(self) -> List[Dict]:
+        """First page, then the remaining pages concurrently, in order"""
+        first_page, headers = await self._scheduler.fetch(
+            await self._public_repos_url())
+        repos = list(first_page)
+        links = parse_links(headers.get("Link"))
+        urls = GithubOrgClient._remaining_page_urls(links)
+        if urls is None:
+            while "next" in links:
+                page, headers = await self._scheduler.fetch(links["next"])
+                repos.extend(page)
+                links = parse_links(headers.get("Link"))
+            return repos
+        pages = await asyncio.gather(
+            *(self._scheduler.fetch(url) for url in urls))
+        for page, _ in pages:
+            repos.extend(page)
+        return repos
+
+    async def _repos_index(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        """Names and license index of repos_payload, built once"""
+        async def build() -> Tuple[List[str], Dict[str, List[str]]]:
+            return GithubOrgClient.build_repos_index(
+                await self.repos_payload())
+        return await self._memoized("repos_index", build)
+
+    async def public_repos(self, license: str = None) -> List[str]:
+        """Public repos"""
+        names, by_license = await self._repos_index()
+        if license is None:
+            return list(names)
+        return list(by_license.get(license, ()))
+
+
+async def audit_orgs(org_names: Iterable[str], license: str = None,
+                     concurrency: int = 16,
+                     scheduler: Optional[RequestScheduler] = None
+                     ) -> Dict[str, List[str]]:
+    """public_repos(license) of many orgs, fetched concurrently.
+    All orgs share one scheduler, so the concurrency cap and the rate
+    limit apply to the whole audit rather than to each org.
+    """
+    own_scheduler = scheduler is None
+    if own_scheduler:
+        scheduler = RequestScheduler(concurrency=concurrency)
+    try:
+        clients = [AsyncGithubOrgClient(name, scheduler)
+                   for name in org_names]
+        results = await asyncio.gather(
+            *(client.public_repos(license) for client in clients))
+        return {client._org_name: repos
+                for client, repos in zip(clients, results)}
+    finally:
+        if own_scheduler:
+            scheduler.close()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for utils and the github org client.
+Run with: python3 benchmark.py [--repos N] [--latency SECONDS]
+The client benchmarks run against replay_server, no network needed.
+"""
+import argparse
+import time
+import timeit
+from typing import Callable, Dict, List, Sequence
+from unittest.mock import patch
+
+from client import GithubOrgClient
+from fixtures import TEST_PAYLOAD
+from replay_server import ReplayServer, scale_payload
+from utils import (
+    access_nested_map,
+    compile_path,
+    conditional_cache,
+    extract_many,
+    reset_session,
+    shared_cache,
+)
+
+LICENSE_PATH = ("license", "key")
+
+
+def _best_per_call(func: Callable, calls: int,
+                   repeat: int = 5, number: int = 20) -> float:
+    """Best observed time of one call of func, in nanoseconds."""
+    best = min(timeit.repeat(func, repeat=repeat, number=number))
+    return best / number / calls * 1e9
+
+
+def bench_access(copies: int = 100) -> Dict[str, float]:
+    """ns per record reading license.key from the fixture repos.
+    Compares the current access_nested_map loop with a compiled getter
+    and with extract_many pulling name and license in one pass.
+    """
+    repos: List[Dict] = TEST_PAYLOAD[0][1] * copies
+    get_license = compile_path(LICENSE_PATH, default=None)
+
+    def nested_map_loop() -> list:
+        """What callers did before: access_nested_map per repo."""
+        keys = []
+        for repo in repos:
+            try:
+                keys.append(access_nested_map(repo, LICENSE_PATH))
+            except KeyError:
+                keys.append(None)
+        return keys
+
+    def compiled_loop() -> list:
+        """One compiled getter reused for every repo."""
+        return [get_license(repo) for repo in repos]
+
+    def extract_columns() -> list:
+        """Name and license key columns in a single pass."""
+        return extract_many(repos, (("name",), LICENSE_PATH))
+
+    assert nested_map_loop() == compiled_loop() == extract_columns()[1]
+    return {
+        "access_nested_map": _best_per_call(nested_map_loop, len(repos)),
+        "compile_path": _best_per_call(compiled_loop, len(repos)),
+        "extract_many (2 paths)": _best_per_call(extract_columns, len(repos)),
+    }
+
+
+def _elapsed_ms(func: Callable) -> float:
+    """Wall time of one call of func, in milliseconds."""
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1e3
+
+
+def _hit_rate(cache) -> float:
+    """Hits as a percentage of all lookups of a cache."""
+    lookups = cache.hits + cache.misses
+    return 100.0 * cache.hits / lookups if lookups else 0.0
+
+
+def bench_client(repos: int = 3000, latency: float = 0.005,
+                 per_page: int = 30, workers: Sequence[int] = (1, 8),
+                 calls: int = 1000) -> Dict[str, Dict[str, float]]:
+    """GithubOrgClient against a local replay of repos scaled-up repos.
+    Returns pagination fetch times (ms), public_repos throughput
+    (calls/s) and cache hit rates (%), each keyed by scenario.
+    """
+    server = ReplayServer(scale_payload(repos), latency=latency,
+                          per_page=per_page)
+    fetch: Dict[str, float] = {}
+    throughput: Dict[str, float] = {}
+    hit_rates: Dict[str, float] = {}
+
+    def cold() -> None:
+        """Forget every cached response and pooled connection."""
+        reset_session()
+        conditional_cache.clear()
+        shared_cache.clear()
+
+    with server, patch.object(GithubOrgClient, "ORG_URL", server.org_url):
+        for count in workers:
+            cold()
+            client = GithubOrgClient("google", max_page_workers=count)
+            fetch["repos_payload, {} workers".format(count)] = \
+                _elapsed_ms(lambda: client.repos_payload)
+        cold()
+        client = GithubOrgClient("google")
+        fetch["stream_repos (sequential)"] = \
+            _elapsed_ms(lambda: sum(1 for _ in client.stream_repos()))
+
+        # every page again: conditional requests answered with 304
+        cold()
+        GithubOrgClient("google").repos_payload
+        client = GithubOrgClient("google")
+        fetch["repos_payload, revalidated"] = \
+            _elapsed_ms(lambda: client.repos_payload)
+        hit_rates["conditional_cache"] = _hit_rate(conditional_cache)
+
+        cold()
+        clients = [GithubOrgClient("google", shared_cache=True)
+                   for _ in range(10)]
+        for shared in clients:
+            shared.public_repos()
+        hit_rates["shared_cache, 10 clients"] = _hit_rate(shared_cache)
+
+        client = GithubOrgClient("google")
+        client.repos_payload
+        throughput["first call (builds index)"] = \
+            1e3 / _elapsed_ms(lambda: client.public_repos("apache-2.0"))
+        for license in (None, "apache-2.0"):
+            best = min(timeit.repeat(lambda: client.public_repos(license),
+                                     repeat=5, number=calls))
+            throughput["public_repos({!r})".format(license)] = calls / best
+    reset_session()
+    return {"fetch": fetch, "throughput": throughput, "hit_rates": hit_rates}
+
+
+def _report(title: str, results: Dict[str, float], unit: str) -> None:
+    """Print one benchmark's results as aligned rows."""
+    print(title)
+    for name, value in results.items():
+        print("  {:<28} {:>10.1f} {}".format(name, value, unit))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repos", type=int, default=3000,
+                        help="repos served by the replay server")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="seconds added to every request")
+    parser.add_argument("--per-page", type=int, default=30,
+                        help="repos per page")
+    args = parser.parse_args()
+
+    _report("license.key lookup", bench_access(), "ns/record")
+    results = bench_client(args.repos, args.latency, args.per_page)
+    _report("pagination fetch ({} repos, {}s latency)".format(
+        args.repos, args.latency), results["fetch"], "ms")
+    _report("public_repos throughput", results["throughput"], "calls/s")
+    _report("cache hit rate", results["hit_rates"], "%")
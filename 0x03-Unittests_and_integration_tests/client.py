@@ -1,15 +1,26 @@
 #!/usr/bin/env python3
 """A github org client
 """
+from concurrent.futures import ThreadPoolExecutor
 from typing import (
+    Iterator,
     List,
     Dict,
+    Optional,
+    Sequence,
+    Tuple,
 )
+from urllib.parse import parse_qs, urlsplit
 
 from utils import (
     get_json,
+    get_json_with_headers,
     access_nested_map,
-    memoize,
+    extract_many,
+    memoize_ttl,
+    page_url,
+    parse_links,
+    stream_json,
 )
 
 
@@ -17,12 +28,32 @@ class GithubOrgClient:
     """A Githib org client
     """
     ORG_URL = "https://api.github.com/orgs/{org}"
+    MAX_PAGE_WORKERS = 8
+    CACHE_TTL = 300
 
-    def __init__(self, org_name: str) -> None:
-        """Init method of GithubOrgClient"""
+    def __init__(self, org_name: str,
+                 max_page_workers: int = MAX_PAGE_WORKERS,
+                 shared_cache: bool = False) -> None:
+        """Init method of GithubOrgClient
+        With shared_cache, org and repos_payload are cached process-wide,
+        so every client for the same org reuses one fetched payload.
+        """
         self._org_name = org_name
+        self._max_page_workers = max_page_workers
+        self._shared_cache = shared_cache
 
-    @memoize
+    def _cache_key(self) -> Optional[tuple]:
+        """Shared cache key, None keeps the cache on this instance"""
+        if not self._shared_cache:
+            return None
+        return (self.ORG_URL, self._org_name)
+
+    def refresh(self) -> None:
+        """Drop the cached org and repos so they are fetched again"""
+        type(self).org.invalidate(self)
+        type(self).repos_payload.invalidate(self)
+
+    @memoize_ttl(ttl=CACHE_TTL, key=_cache_key)
     def org(self) -> Dict:
         """Memoize org"""
         return get_json(self.ORG_URL.format(org=self._org_name))
@@ -32,20 +63,100 @@ class GithubOrgClient:
         """Public repos URL"""
         return self.org["repos_url"]
 
-    @memoize
-    def repos_payload(self) -> Dict:
-        """Memoize repos payload"""
-        return get_json(self._public_repos_url)
+    @memoize_ttl(ttl=CACHE_TTL, key=_cache_key)
+    def repos_payload(self) -> List[Dict]:
+        """Memoize repos payload, every page of it"""
+        return list(self.iter_repos())
+
+    def iter_repos(self) -> Iterator[Dict]:
+        """Lazily yield every public repo of the org, in page order.
+        The first page is fetched alone; its Link header says how many
+        pages there are and the rest are fetched concurrently on a
+        bounded thread pool, then yielded in order as they complete.
+        """
+        first_page, headers = get_json_with_headers(self._public_repos_url)
+        yield from first_page
+        links = parse_links(headers.get("Link"))
+        urls = self._remaining_page_urls(links)
+        if urls is None:
+            # no rel="last" to plan with, walk the rel="next" chain
+            yield from self._follow_next(links)
+            return
+        if not urls:
+            return
+        pool = ThreadPoolExecutor(
+            max_workers=min(self._max_page_workers, len(urls)))
+        try:
+            # map keeps page order whatever order the requests finish in
+            for page in pool.map(get_json, urls):
+                yield from page
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stream_repos(self, paths: Optional[Sequence[Sequence]] = None
+                     ) -> Iterator:
+        """Yield repos one at a time while each page is still downloading.
+        Memory stays bounded by one repo instead of one page or the whole
+        payload, at the cost of fetching pages one after another. With
+        paths, each repo is projected to a tuple of those values.
+        """
+        url = self._public_repos_url
+        while url:
+            headers: Dict = {}
+            yield from stream_json(url, paths=paths,
+                                   on_headers=headers.update)
+            url = parse_links(headers.get("Link")).get("next")
+
+    @staticmethod
+    def _remaining_page_urls(links: Dict[str, str]) -> Optional[List[str]]:
+        """URLs of pages 2..last, or None when there is no rel="last"."""
+        if "last" not in links:
+            return None if "next" in links else []
+        last_url = links["last"]
+        try:
+            last_page = int(parse_qs(urlsplit(last_url).query)["page"][0])
+        except (KeyError, ValueError):
+            return None
+        return [page_url(last_url, page) for page in range(2, last_page + 1)]
+
+    @staticmethod
+    def _follow_next(links: Dict[str, str]) -> Iterator[Dict]:
+        """Yield repos by following rel="next" links one page at a time."""
+        while "next" in links:
+            page, headers = get_json_with_headers(links["next"])
+            yield from page
+            links = parse_links(headers.get("Link"))
+
+    def _repos_index(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        """Repo names, and repo names per license key, of repos_payload
+        Built in one pass the first time it is needed for a payload; a
+        refreshed repos_payload is a new object, which triggers a rebuild.
+        """
+        payload = self.repos_payload
+        index = self.__dict__.get("_license_index")
+        if index is None or index[0] is not payload:
+            index = (payload,) + self.build_repos_index(payload)
+            self._license_index = index
+        return index[1], index[2]
+
+    @staticmethod
+    def build_repos_index(payload: List[Dict]
+                          ) -> Tuple[List[str], Dict[str, List[str]]]:
+        """Static: repo names and license key -> repo names, in one pass"""
+        names, license_keys = extract_many(
+            payload, (("name",), ("license", "key")))
+        by_license: Dict[str, List[str]] = {}
+        for name, license_key in zip(names, license_keys):
+            if license_key is not None:
+                by_license.setdefault(license_key, []).append(name)
+        return names, by_license
 
     def public_repos(self, license: str = None) -> List[str]:
         """Public repos"""
-        json_payload = self.repos_payload
-        public_repos = [
-            repo["name"] for repo in json_payload
-            if license is None or self.has_license(repo, license)
-        ]
-
-        return public_repos
+        names, by_license = self._repos_index()
+        if license is None:
+            return list(names)
+        return list(by_license.get(license, ()))
 
     @staticmethod
     def has_license(repo: Dict[str, Dict], license_key: str) -> bool:
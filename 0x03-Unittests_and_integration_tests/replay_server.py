@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Offline stand-in for the GitHub API, replaying fixtures locally.
+Serves /orgs/<org> and /orgs/<org>/repos the way api.github.com does:
+paginated with Link headers, ETag/Last-Modified validators answered
+with 304, X-RateLimit-* headers and an optional per-request latency.
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from fixtures import TEST_PAYLOAD
+
+ORG_PAYLOAD, REPOS_PAYLOAD, _, _ = TEST_PAYLOAD[0]
+PER_PAGE = 30
+MAX_PER_PAGE = 100
+
+
+def scale_payload(count: int,
+                  templates: Sequence[Dict] = REPOS_PAYLOAD) -> List[Dict]:
+    """count repos cycled from the fixture repos, each with a unique
+    id and name, so license mix and record shape match the fixtures.
+    """
+    repos = []
+    for index in range(count):
+        template = templates[index % len(templates)]
+        repo = copy.deepcopy(template)
+        if index >= len(templates):
+            name = "{}-{}".format(template["name"], index // len(templates))
+            owner = template["full_name"].split("/")[0]
+            repo["id"] = template["id"] * 1000 + index
+            repo["name"] = name
+            repo["full_name"] = "{}/{}".format(owner, name)
+        repos.append(repo)
+    return repos
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Answers GitHub org and repos requests from ReplayServer's data"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        """Route /orgs/<org> and /orgs/<org>/repos?page=N&per_page=M"""
+        replay = self.server.replay
+        replay._enter()
+        try:
+            if replay.latency:
+                time.sleep(replay.latency)
+            parts = urlsplit(self.path)
+            segments = parts.path.strip("/").split("/")
+            if len(segments) == 2 and segments[0] == "orgs":
+                body, etag = replay._org_body(segments[1])
+                links = None
+            elif len(segments) == 3 and segments[0] == "orgs" \
+                    and segments[2] == "repos":
+                query = parse_qs(parts.query)
+                try:
+                    page = int(query.get("page", ["1"])[0])
+                    per_page = int(query.get("per_page",
+                                             [replay.per_page])[0])
+                except ValueError:
+                    self.send_json(400, {"message": "Bad Request"})
+                    return
+                per_page = max(1, min(per_page, MAX_PER_PAGE))
+                body, etag = replay._page_body(page, per_page)
+                links = replay._links(parts.path, page, per_page,
+                                      "per_page" in query)
+            else:
+                self.send_json(404, {"message": "Not Found"})
+                return
+            if self.headers.get("If-None-Match") == etag or \
+                    self.headers.get("If-Modified-Since") == \
+                    replay.last_modified:
+                # conditional hits do not count against the rate limit
+                replay._count(not_modified=True)
+                self.send_body(304, b"", etag, links)
+                return
+            if not replay._count(not_modified=False):
+                self.send_body(403, json.dumps({
+                    "message": "API rate limit exceeded"}).encode(),
+                    etag, None)
+                return
+            self.send_body(200, body, etag, links)
+        finally:
+            replay._leave()
+
+    def send_body(self, status: int, body: bytes, etag: str,
+                  links: Optional[str]) -> None:
+        """Write a response with validator and rate-limit headers"""
+        replay = self.server.replay
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", replay.last_modified)
+        if links:
+            self.send_header("Link", links)
+        for name, value in replay.rate_limit_headers().items():
+            self.send_header(name, value)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, body: Dict) -> None:
+        """Write an error document"""
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        """Keep benchmark and test output quiet"""
+
+
+class ReplayServer:
+    """Local HTTP server replaying an org and its repos.
+    Point a client at it through ``org_url``, e.g. by patching
+    GithubOrgClient.ORG_URL. Every org name gets the same repos. Pages
+    are encoded once and reused, so the server adds little beyond the
+    configured latency to what a benchmark measures.
+    """
+
+    def __init__(self, repos: Optional[Sequence[Dict]] = None,
+                 latency: float = 0.0, per_page: int = PER_PAGE,
+                 rate_limit: int = 5000, rate_window: float = 3600.0
+                 ) -> None:
+        """Init method of ReplayServer
+        Parameters
+        ----------
+        repos: list, optional
+            repos to serve, the fixture repos by default
+        latency: float
+            seconds each request sleeps before answering
+        per_page: int
+            page size when the request has no per_page parameter
+        rate_limit: int
+            X-RateLimit-Limit, requests allowed per window
+        rate_window: float
+            seconds until X-RateLimit-Reset
+        """
+        self.repos = list(REPOS_PAYLOAD if repos is None else repos)
+        self.latency = latency
+        self.per_page = per_page
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.last_modified = formatdate(usegmt=True)
+        self._lock = threading.Lock()
+        self._bodies: Dict[Tuple, Tuple[bytes, str]] = {}
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Reset the request counters and the rate-limit budget."""
+        with self._lock:
+            self.requests = 0
+            self.not_modified = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.remaining = self.rate_limit
+            self.reset_at = time.time() + self.rate_window
+
+    def start(self) -> "ReplayServer":
+        """Start serving on a free local port."""
+        if self._httpd is None:
+            self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), ReplayHandler)
+            self._httpd.replay = self
+            self._thread = threading.Thread(
+                target=self._httpd.serve_forever, name="replay-server",
+                daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the server."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+            self._thread = None
+
+    def __enter__(self) -> "ReplayServer":
+        """Context manager entry"""
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        """Context manager exit"""
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        """http://127.0.0.1:<port>"""
+        return "http://127.0.0.1:{}".format(self._httpd.server_port)
+
+    @property
+    def org_url(self) -> str:
+        """Drop-in value for GithubOrgClient.ORG_URL"""
+        return self.base_url + "/orgs/{org}"
+
+    @property
+    def pages(self) -> int:
+        """Number of repos pages at the default page size"""
+        return max(1, -(-len(self.repos) // self.per_page))
+
+    def rate_limit_headers(self) -> Dict[str, str]:
+        """X-RateLimit-* headers for the current budget"""
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(int(self.reset_at)),
+        }
+
+    def _enter(self) -> None:
+        """Track a request starting"""
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _leave(self) -> None:
+        """Track a request finishing"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def _count(self, not_modified: bool) -> bool:
+        """Count an answered request and spend rate-limit budget.
+        False when the budget of the current window is spent.
+        """
+        with self._lock:
+            self.requests += 1
+            if time.time() >= self.reset_at:
+                self.remaining = self.rate_limit
+                self.reset_at = time.time() + self.rate_window
+            if not_modified:
+                self.not_modified += 1
+                return True
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def _encoded(self, key: Tuple, build) -> Tuple[bytes, str]:
+        """Encoded body and ETag for key, built on first use"""
+        entry = self._bodies.get(key)
+        if entry is None:
+            body = json.dumps(build()).encode()
+            etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            entry = self._bodies.setdefault(key, (body, etag))
+        return entry
+
+    def _org_body(self, org: str) -> Tuple[bytes, str]:
+        """Org document whose repos_url points back at this server"""
+        def build() -> Dict:
+            payload = dict(ORG_PAYLOAD)
+            payload["login"] = org
+            payload["repos_url"] = "{}/orgs/{}/repos".format(
+                self.base_url, org)
+            return payload
+        return self._encoded(("org", org), build)
+
+    def _page_body(self, page: int, per_page: int) -> Tuple[bytes, str]:
+        """One page of repos; past the last page it is empty"""
+        start = (page - 1) * per_page
+        return self._encoded(
+            ("repos", page, per_page),
+            lambda: self.repos[max(start, 0):max(start + per_page, 0)])
+
+    def _links(self, path: str, page: int, per_page: int,
+               explicit_per_page: bool) -> str:
+        """GitHub-style Link header for a page of the repos list"""
+        last = max(1, -(-len(self.repos) // per_page))
+        if explicit_per_page:
+            template = "{}{}?per_page={}&page={{}}".format(
+                self.base_url, path, per_page)
+        else:
+            template = "{}{}?page={{}}".format(self.base_url, path)
+        rels = []
+        if page > 1:
+            rels.append(("prev", page - 1))
+            rels.append(("first", 1))
+        if page < last:
+            rels.append(("next", page + 1))
+        rels.append(("last", last))
+        return ", ".join('<{}>; rel="{}"'.format(template.format(n), rel)
+                         for rel, n in rels)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Integration tests for AsyncGithubOrgClient against the replay server"""
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from async_client import (
+    AdaptiveTokenBucket,
+    AsyncGithubOrgClient,
+    RequestScheduler,
+    audit_orgs,
+)
+from fixtures import TEST_PAYLOAD
+from replay_server import ReplayServer
+from utils import conditional_cache, reset_session
+
+ORG_PAYLOAD, REPOS_PAYLOAD, EXPECTED_REPOS, APACHE2_REPOS = TEST_PAYLOAD[0]
+PER_PAGE = 3
+
+
+class TestAsyncGithubOrgClient(unittest.TestCase):
+    """AsyncGithubOrgClient and audit_orgs against the replay server"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Start the replay server and point the client at it"""
+        cls.server = ReplayServer(per_page=PER_PAGE, rate_window=60).start()
+        cls.url_patcher = patch.object(
+            AsyncGithubOrgClient, "ORG_URL", cls.server.org_url)
+        cls.url_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the replay server"""
+        cls.url_patcher.stop()
+        cls.server.stop()
+        reset_session()
+
+    def setUp(self):
+        """Reset the server's counters and the HTTP caches"""
+        conditional_cache.clear()
+        self.server.latency = 0.0
+        self.server.rate_limit = 5000
+        self.server.reset()
+
+    def test_public_repos(self):
+        """All pages are fetched and filtered like the sync client"""
+        async def run():
+            async with RequestScheduler(concurrency=4) as scheduler:
+                client = AsyncGithubOrgClient("google", scheduler)
+                return (await client.public_repos(),
+                        await client.public_repos(license="apache-2.0"))
+
+        repos, apache2 = asyncio.run(run())
+        self.assertEqual(repos, EXPECTED_REPOS)
+        self.assertEqual(apache2, APACHE2_REPOS)
+
+    def test_audit_respects_concurrency_cap(self):
+        """Many orgs run concurrently, never above the global cap"""
+        self.server.latency = 0.01
+        orgs = ["org{}".format(i) for i in range(10)]
+
+        results = asyncio.run(audit_orgs(orgs, license="apache-2.0",
+                                         concurrency=5))
+
+        self.assertEqual(results, {org: APACHE2_REPOS for org in orgs})
+        self.assertLessEqual(self.server.max_in_flight, 5)
+        self.assertGreater(self.server.max_in_flight, 1)
+
+    def test_slows_down_near_the_limit(self):
+        """A nearly spent budget lowers the request rate instead of failing"""
+        self.server.rate_limit = 100
+        self.server.reset()
+        self.server.remaining = 13
+
+        async def run():
+            bucket = AdaptiveTokenBucket(rate=1000, capacity=1000,
+                                         min_rate=0.001)
+            async with RequestScheduler(concurrency=8,
+                                        bucket=bucket) as scheduler:
+                await AsyncGithubOrgClient("google", scheduler).org()
+                return bucket.rate
+
+        rate = asyncio.run(run())
+        # 12 left, 10 held in reserve: 2 requests over the 60s window
+        self.assertAlmostEqual(rate, 2 / 60, delta=0.01)
+
+    def test_failed_fetch_is_not_memoized(self):
+        """A 403 raises, and the same client retries once budget is back"""
+        self.server.rate_limit = 0
+        self.server.reset()
+
+        async def run():
+            bucket = AdaptiveTokenBucket()
+            async with RequestScheduler(concurrency=2,
+                                        bucket=bucket) as scheduler:
+                client = AsyncGithubOrgClient("google", scheduler)
+                with self.assertRaises(requests.HTTPError):
+                    await client.org()
+                # as once the window has reset
+                self.server.rate_limit = 5000
+                self.server.reset()
+                bucket.paused_until = 0.0
+                return await client.org()
+
+        self.assertEqual(asyncio.run(run())["login"], "google")
+
+    def test_adapts_to_the_headers_of_a_304(self):
+        """A revalidated page feeds the bucket its live budget"""
+        async def run():
+            bucket = AdaptiveTokenBucket(rate=1000, capacity=1000,
+                                         min_rate=0.001)
+            async with RequestScheduler(concurrency=2,
+                                        bucket=bucket) as scheduler:
+                await AsyncGithubOrgClient("google", scheduler).org()
+                self.server.rate_limit = 100
+                self.server.remaining = 12
+                await AsyncGithubOrgClient("google", scheduler).org()
+                return bucket.rate
+
+        rate = asyncio.run(run())
+        self.assertEqual(self.server.not_modified, 1)
+        # 12 left, 10 held in reserve: 2 requests over the 60s window
+        self.assertAlmostEqual(rate, 2 / 60, delta=0.01)
+
+
+class TestAdaptiveTokenBucket(unittest.TestCase):
+    """Unit tests for AdaptiveTokenBucket"""
+
+    def test_pauses_when_budget_is_spent(self):
+        """With no budget left, acquire waits for the reset"""
+        async def run():
+            bucket = AdaptiveTokenBucket(rate=100, capacity=5)
+            bucket.update({"X-RateLimit-Remaining": "0",
+                           "X-RateLimit-Reset": str(time.time())})
+            start = time.monotonic()
+            await bucket.acquire()
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.9)
+
+    def test_headers_in_any_case(self):
+        """Header names are matched case-insensitively"""
+        bucket = AdaptiveTokenBucket(rate=1000, min_rate=0.001)
+        bucket.update({"x-ratelimit-remaining": "0",
+                       "x-ratelimit-reset": str(time.time() + 60)})
+        self.assertEqual(bucket.tokens, 0.0)
+        self.assertGreater(bucket.paused_until, time.monotonic())
+
+    def test_ignores_responses_without_headers(self):
+        """Missing rate-limit headers leave the rate unchanged"""
+        bucket = AdaptiveTokenBucket(rate=7)
+        bucket.update({})
+        self.assertEqual(bucket.rate, 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
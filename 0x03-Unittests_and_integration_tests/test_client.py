@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 """A unittest for GithubOrgClient"""
+import time
 import unittest
 from unittest.mock import patch, PropertyMock, Mock
 from parameterized import parameterized, parameterized_class
 from client import GithubOrgClient
 from fixtures import TEST_PAYLOAD
+from utils import extract_many, shared_cache
 
 
 class TestGithubOrgClient(unittest.TestCase):
@@ -60,18 +62,19 @@ class TestGithubOrgClient(unittest.TestCase):
             self.assertEqual(result,
                              "https://api.github.com/orgs/google/repos")
 
-    @patch("client.get_json")
+    @patch("client.get_json_with_headers")
     def test_public_repos(self, mock_get_json) -> None:
         """Tests public_repos method of GithubOrgClient
-            - Mocks the get_json function to return a specific payload
+            - Mocks the get_json_with_headers function to return a payload
             - Mocks the repos_payload property to return a specific payload
             - Asserts that public_repos returns the expected list of repo names
 
-            public_repos() calls repos_payload, which calls get_json with
-            _public_repos_url. That's why we mock everything
+            public_repos() calls repos_payload, which calls
+            get_json_with_headers with _public_repos_url.
+            That's why we mock everything
         """
-        # Mock get_json (used by repos_payload) to avoid making a real API call
-        mock_get_json.return_value = TEST_PAYLOAD[0][1]
+        # Mock the first page fetch (no Link header: a single page)
+        mock_get_json.return_value = (TEST_PAYLOAD[0][1], {})
 
         # Mock _public_repos_url property because it is used in repos_payload
         with patch("client.GithubOrgClient._public_repos_url",
@@ -95,6 +98,116 @@ class TestGithubOrgClient(unittest.TestCase):
             mock_get_json.assert_called_once_with(
                 TEST_PAYLOAD[0][0]["repos_url"])
 
+    @patch("client.get_json")
+    @patch("client.get_json_with_headers")
+    def test_repos_payload_fetches_every_page(self, mock_first_page,
+                                              mock_get_json) -> None:
+        """Pages 2..last from the Link header are fetched and kept in order
+            - later pages finish first to show the order is still kept
+        """
+        repos_url = "https://api.github.com/organizations/1/repos"
+        mock_first_page.return_value = ([{"name": "page1"}], {
+            "Link": '<{0}?page=2>; rel="next", '
+                    '<{0}?page=4>; rel="last"'.format(repos_url)
+        })
+
+        def fetch_page(url):
+            """Slower for lower pages, so completion order is reversed"""
+            page = int(url.rsplit("=", 1)[1])
+            time.sleep((4 - page) * 0.02)
+            return [{"name": "page{}".format(page)}]
+
+        mock_get_json.side_effect = fetch_page
+
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock, return_value=repos_url):
+            client = GithubOrgClient("google")
+            self.assertEqual(client.public_repos(),
+                             ["page1", "page2", "page3", "page4"])
+
+        self.assertEqual(
+            sorted(call.args[0] for call in mock_get_json.call_args_list),
+            ["{}?page={}".format(repos_url, page) for page in (2, 3, 4)])
+
+    @patch("client.get_json_with_headers")
+    def test_iter_repos_follows_next_without_last(self, mock_get) -> None:
+        """Without rel="last" the rel="next" chain is walked"""
+        mock_get.side_effect = [
+            ([{"name": "a"}], {"Link": '<https://x/r?page=2>; rel="next"'}),
+            ([{"name": "b"}], {}),
+        ]
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock, return_value="https://x/r"):
+            client = GithubOrgClient("google")
+            names = [repo["name"] for repo in client.iter_repos()]
+
+        self.assertEqual(names, ["a", "b"])
+        mock_get.assert_called_with("https://x/r?page=2")
+
+    @patch("client.get_json")
+    def test_shared_cache_across_clients(self, mock_get_json) -> None:
+        """Clients built with shared_cache reuse one fetch per org"""
+        shared_cache.clear()
+        mock_get_json.return_value = {"login": "google"}
+
+        first = GithubOrgClient("google", shared_cache=True)
+        second = GithubOrgClient("google", shared_cache=True)
+        self.assertIs(first.org, second.org)
+        mock_get_json.assert_called_once()
+
+        second.refresh()
+        second.org
+        self.assertEqual(mock_get_json.call_count, 2)
+        shared_cache.clear()
+
+    def test_license_index_built_once_per_payload(self) -> None:
+        """Filtered calls reuse the index until repos_payload changes"""
+        first = [
+            {"name": "a", "license": {"key": "mit"}},
+            {"name": "b", "license": None},
+            {"name": "c", "license": {"key": "mit"}},
+        ]
+        second = [{"name": "d", "license": {"key": "apache-2.0"}}]
+
+        with patch("client.GithubOrgClient.repos_payload",
+                   new_callable=PropertyMock, return_value=first) as payload, \
+                patch("client.extract_many",
+                      wraps=extract_many) as mock_extract:
+            client = GithubOrgClient("google")
+            self.assertEqual(client.public_repos("mit"), ["a", "c"])
+            self.assertEqual(client.public_repos("apache-2.0"), [])
+            self.assertEqual(client.public_repos(), ["a", "b", "c"])
+            mock_extract.assert_called_once()
+
+            payload.return_value = second
+            self.assertEqual(client.public_repos("apache-2.0"), ["d"])
+            self.assertEqual(client.public_repos(), ["d"])
+            self.assertEqual(mock_extract.call_count, 2)
+
+    @patch("client.stream_json")
+    def test_stream_repos_follows_pages(self, mock_stream) -> None:
+        """stream_repos streams each page and follows rel="next" """
+        pages = {
+            "https://x/r": ([("a",), ("b",)],
+                            {"Link": '<https://x/r?page=2>; rel="next"'}),
+            "https://x/r?page=2": ([("c",)], {}),
+        }
+
+        def stream(url, paths=None, on_headers=None):
+            """Report the page's headers, then yield its items"""
+            items, headers = pages[url]
+            on_headers(headers)
+            yield from items
+
+        mock_stream.side_effect = stream
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock, return_value="https://x/r"):
+            client = GithubOrgClient("google")
+            rows = list(client.stream_repos(paths=[("name",)]))
+
+        self.assertEqual(rows, [("a",), ("b",), ("c",)])
+        self.assertEqual(mock_stream.call_count, 2)
+
     @parameterized.expand([
         ({"license": {"key": "my_license"}}, "my_license", True),
         ({"license": {"key": "other_license"}}, "my_license", False),
@@ -122,15 +235,15 @@ class TestIntegrationGithubOrgClient(unittest.TestCase):
     def setUpClass(self):
         """Set up for the integration tests"""
 
-        def side_effect(url):
-            """Side effect function for mocking requests.get from utils.py
+        def side_effect(url, **kwargs):
+            """Side effect function for mocking the session get in utils.py
                 Returns a Mock object with a .json() method that returns
                 the appropriate payload based on the URL
             """
             # Matches ORG_URL so we can mock GithubOrgClient.org property
             base_url = self.org_payload["repos_url"].replace("/repos", "")
 
-            mock_resp = Mock()
+            mock_resp = Mock(status_code=200, headers={})
 
             # Hanldes requests made by GithubOrgClient.org
             # to ORG_URL: https://api.github.com/orgs/{org}
@@ -145,9 +258,9 @@ class TestIntegrationGithubOrgClient(unittest.TestCase):
 
             raise ValueError(f"Wrong URL called: {url}")
 
-        # Patch requests.get for all tests in this class
-        self.get_patcher = patch("requests.get")
-        mock_get = self.get_patcher.start()
+        # Patch the shared session's get for all tests in this class
+        self.get_patcher = patch("utils.get_session")
+        mock_get = self.get_patcher.start().return_value.get
         mock_get.side_effect = side_effect
 
     def test_public_repos(self):
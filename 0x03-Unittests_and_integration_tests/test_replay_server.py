@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Tests for the offline replay server and the payload scaler"""
+import unittest
+from unittest.mock import patch
+
+import requests
+from parameterized import parameterized
+
+from client import GithubOrgClient
+from fixtures import TEST_PAYLOAD
+from replay_server import ReplayServer, scale_payload
+from utils import (conditional_cache, get_json, reset_session,
+                   shared_cache)
+
+REPOS_PAYLOAD = TEST_PAYLOAD[0][1]
+
+
+class TestScalePayload(unittest.TestCase):
+    """Unit tests for scale_payload"""
+
+    def test_unique_names_and_ids(self):
+        """Every generated repo has its own name and id"""
+        repos = scale_payload(1000)
+        self.assertEqual(len(repos), 1000)
+        self.assertEqual(len({repo["name"] for repo in repos}), 1000)
+        self.assertEqual(len({repo["id"] for repo in repos}), 1000)
+
+    def test_keeps_fixture_license_mix(self):
+        """Licenses repeat the fixture repos in order"""
+        repos = scale_payload(len(REPOS_PAYLOAD) * 3)
+        self.assertEqual(repos[:len(REPOS_PAYLOAD)], REPOS_PAYLOAD)
+        for index, repo in enumerate(repos):
+            self.assertEqual(
+                repo["license"],
+                REPOS_PAYLOAD[index % len(REPOS_PAYLOAD)]["license"])
+
+    def test_does_not_share_nested_dicts(self):
+        """Generated repos can be changed without touching the fixtures"""
+        repos = scale_payload(len(REPOS_PAYLOAD) + 1)
+        repos[-1]["owner"]["login"] = "someone-else"
+        self.assertNotEqual(REPOS_PAYLOAD[0]["owner"]["login"],
+                            "someone-else")
+
+
+class TestReplayServer(unittest.TestCase):
+    """GithubOrgClient against the replay server"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Serve 250 repos, 30 per page"""
+        cls.repos = scale_payload(250)
+        cls.server = ReplayServer(cls.repos).start()
+        cls.url_patcher = patch.object(GithubOrgClient, "ORG_URL",
+                                       cls.server.org_url)
+        cls.url_patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the replay server"""
+        cls.url_patcher.stop()
+        cls.server.stop()
+        reset_session()
+
+    def setUp(self):
+        """Fresh counters and caches for every test"""
+        conditional_cache.clear()
+        shared_cache.clear()
+        self.server.rate_limit = 5000
+        self.server.reset()
+
+    @parameterized.expand([
+        (None,),
+        ("apache-2.0",),
+        ("bsd-3-clause",),
+    ])
+    def test_public_repos_across_pages(self, license):
+        """Every page is fetched and filtered in order"""
+        expected = [repo["name"] for repo in self.repos
+                    if license is None or GithubOrgClient.has_license(
+                        repo, license)]
+        client = GithubOrgClient("google")
+        self.assertEqual(client.public_repos(license), expected)
+        # the org document plus one request per page
+        self.assertEqual(self.server.requests, 1 + self.server.pages)
+
+    def test_second_client_revalidates(self):
+        """A repeat fetch is all 304s answered from the conditional cache"""
+        GithubOrgClient("google").public_repos()
+        names = GithubOrgClient("google").public_repos()
+
+        self.assertEqual(len(names), len(self.repos))
+        self.assertEqual(self.server.not_modified, 1 + self.server.pages)
+        self.assertEqual(conditional_cache.hits, 1 + self.server.pages)
+        self.assertEqual(self.server.remaining,
+                         self.server.rate_limit - 1 - self.server.pages)
+
+    def test_per_page_is_kept_in_links(self):
+        """An explicit per_page carries over into the Link header"""
+        response = requests.get(self.server.base_url +
+                                "/orgs/google/repos?per_page=100")
+        self.assertEqual(len(response.json()), 100)
+        self.assertEqual(response.links["last"]["url"],
+                         self.server.base_url +
+                         "/orgs/google/repos?per_page=100&page=3")
+
+    def test_rate_limit_exceeded(self):
+        """Once the budget is spent the server answers 403"""
+        self.server.rate_limit = 1
+        self.server.reset()
+        url = self.server.base_url + "/orgs/google"
+        self.assertEqual(requests.get(url).status_code, 200)
+        response = requests.get(url)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.headers["X-RateLimit-Remaining"], "0")
+
+    def test_rate_limit_error_is_not_cached(self):
+        """A 403 is not replayed through a 304 once the budget resets"""
+        self.server.rate_limit = 1
+        self.server.reset()
+        self.assertEqual(get_json(self.server.base_url +
+                                  "/orgs/google/repos")[0]["name"],
+                         self.repos[0]["name"])
+        url = self.server.org_url.format(org="google")
+        self.assertEqual(get_json(url),
+                         {"message": "API rate limit exceeded"})
+        self.assertEqual(conditional_cache.request_headers(url), {})
+
+        self.server.reset()
+        self.assertEqual(get_json(url)["login"], "google")
+        self.assertEqual(self.server.not_modified, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,10 +3,28 @@
 Unit tests for utils.py: access_nested_map, get_json, memoize
 """
 
+import json
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from parameterized import parameterized
 from unittest.mock import patch, Mock
-from utils import access_nested_map, get_json, memoize
+from utils import (
+    access_nested_map,
+    compile_path,
+    conditional_cache,
+    extract_many,
+    get_json,
+    get_json_with_headers,
+    iter_json_array,
+    memoize,
+    memoize_ttl,
+    parse_links,
+    reset_session,
+    shared_cache,
+    stream_json,
+)
 
 
 class TestAccessNestedMap(unittest.TestCase):
@@ -32,26 +50,289 @@ class TestAccessNestedMap(unittest.TestCase):
         self.assertEqual(str(error.exception), repr(path[-1]))
 
 
+class TestCompilePath(unittest.TestCase):
+    """Unit tests for compile_path and extract_many."""
+
+    @parameterized.expand([
+        ({"a": 1}, ("a",)),
+        ({"a": {"b": 2}}, ("a",)),
+        ({"a": {"b": 2}}, ("a", "b")),
+        ({"a": {"b": {"c": {"d": 4}}}}, ("a", "b", "c", "d")),
+    ])
+    def test_matches_access_nested_map(self, nested_map, path):
+        """Compiled getters return what access_nested_map returns."""
+        self.assertEqual(compile_path(path)(nested_map),
+                         access_nested_map(nested_map, path))
+
+    @parameterized.expand([
+        ({}, ("a",)),
+        ({"a": 1}, ("a", "b")),
+        ({"a": None}, ("a", "b")),
+        ({"a": "text"}, ("a", "b")),
+        ({"a": [10, 20]}, ("a", "b")),
+        ({"a": [10, 20]}, ("a", 1)),
+        ({"a": {"b": 1}}, ("a", "b", "c")),
+    ])
+    def test_missing_path(self, nested_map, path):
+        """Misses raise the same KeyError, or return the default."""
+        with self.assertRaises(KeyError) as error:
+            compile_path(path)(nested_map)
+        with self.assertRaises(KeyError) as expected:
+            access_nested_map(nested_map, path)
+        self.assertEqual(str(error.exception), str(expected.exception))
+        self.assertEqual(compile_path(path, default="x")(nested_map), "x")
+
+    def test_extract_many(self):
+        """Several paths are pulled into aligned columns."""
+        records = [
+            {"name": "a", "license": {"key": "mit"}},
+            {"name": "b", "license": None},
+            {"name": "c"},
+        ]
+        self.assertEqual(
+            extract_many(records, [("name",), ("license", "key")]),
+            [["a", "b", "c"], ["mit", None, None]])
+
+
+class TestIterJsonArray(unittest.TestCase):
+    """Unit tests for the incremental JSON array decoder."""
+
+    repos = [
+        {"name": "episodes.dart", "license": None, "forks": 22},
+        {"name": "kratu", "license": {"key": "apache-2.0"}, "forks": 0.5},
+        "caf\u00e9", 12345, True, None, [1, [2]],
+    ]
+
+    @staticmethod
+    def chunked(data, size):
+        """Split bytes into pieces of size bytes."""
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    @parameterized.expand([(1,), (3,), (7,), (4096,)])
+    def test_any_chunk_boundary(self, size):
+        """Elements decode the same however the body is split."""
+        body = json.dumps(self.repos, indent=2).encode()
+        self.assertEqual(list(iter_json_array(self.chunked(body, size))),
+                         self.repos)
+
+    def test_projection(self):
+        """paths turn each element into a tuple of the requested values."""
+        body = json.dumps(self.repos[:2]).encode()
+        self.assertEqual(
+            list(iter_json_array([body], [("name",), ("license", "key")])),
+            [("episodes.dart", None), ("kratu", "apache-2.0")])
+
+    def test_is_incremental(self):
+        """The first element is yielded before the rest is read."""
+        consumed = []
+
+        def chunks():
+            """Endless array body, recording how much was pulled."""
+            yield b"["
+            index = 0
+            while True:
+                consumed.append(index)
+                yield json.dumps({"id": index}).encode() + b","
+                index += 1
+
+        stream = iter_json_array(chunks())
+        self.assertEqual(next(stream), {"id": 0})
+        self.assertEqual(next(stream), {"id": 1})
+        self.assertLessEqual(len(consumed), 3)
+
+    @parameterized.expand([
+        (b'{"a": 1}',),
+        (b'[{"a": 1}',),
+        (b'[1, 2',),
+        (b'[1] [2]',),
+    ])
+    def test_malformed(self, body):
+        """Non-arrays and truncated or trailing data raise ValueError."""
+        with self.assertRaises(ValueError):
+            list(iter_json_array([body]))
+
+    def test_empty_array(self):
+        """An empty array yields nothing."""
+        self.assertEqual(list(iter_json_array([b" [ ] "])), [])
+
+
 class TestGetJson(unittest.TestCase):
     """Unit tests for the get_json function."""
 
+    def setUp(self):
+        """Start every test with an empty conditional cache."""
+        conditional_cache.clear()
+
     @parameterized.expand([
         ("http://example.com", {"payload": True}),
         ("http://holberton.io", {"payload": False}),
     ])
-    @patch("utils.requests.get")
-    def test_get_json(self, url, payload, mock_get):
+    @patch("utils.get_session")
+    def test_get_json(self, url, payload, mock_get_session):
         """Test that get_json returns the expected payload."""
-        mock_response = Mock()
+        mock_response = Mock(status_code=200, headers={})
         mock_response.json.return_value = payload
+        mock_get = mock_get_session.return_value.get
         mock_get.return_value = mock_response
 
         result = get_json(url)
 
-        mock_get.assert_called_once_with(url)
+        mock_get.assert_called_once_with(url, headers={})
         self.assertEqual(result, payload)
 
 
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves one JSON document with ETag or Last-Modified validators."""
+
+    protocol_version = "HTTP/1.1"
+    payload = {"repos": ["episodes.dart", "kratu"]}
+    etag = '"v1"'
+    last_modified = "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    def do_GET(self):
+        """Answer 304 when the client's validator still matches."""
+        server = self.server
+        with server.lock:
+            server.requests.append(dict(self.headers))
+            server.client_ports.add(self.client_address[1])
+        if self.path == "/stream":
+            body = json.dumps(self.payload["repos"]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path.startswith("/pages/"):
+            self.send_page(int(self.path.rsplit("/", 1)[1]))
+            return
+        if self.path == "/etag":
+            validator = ("ETag", self.etag)
+            fresh = self.headers.get("If-None-Match") == self.etag
+        else:
+            validator = ("Last-Modified", self.last_modified)
+            fresh = self.headers.get("If-Modified-Since") == self.last_modified
+        if fresh:
+            self.send_response(304)
+            self.send_header(*validator)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps(self.payload).encode()
+        self.send_response(200)
+        self.send_header(*validator)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_page(self, page):
+        """Two pages linked by a lowercase link header, which the 304
+        does not repeat; every answer says how many requests came first
+        """
+        etag = '"page{}"'.format(page)
+        with self.server.lock:
+            served = str(len(self.server.requests))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("X-Served", served)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps(["r{}".format(page)]).encode()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("X-Served", served)
+        if page == 1:
+            self.send_header("link", '<http://{}:{}/pages/2>; rel="next"'
+                             .format(*self.server.server_address))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Keep test output quiet."""
+
+
+class TestGetJsonLocalServer(unittest.TestCase):
+    """get_json against a local stub server: pooling and 304 handling."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Start the stub server on a free port."""
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.server.lock = threading.Lock()
+        cls.base_url = "http://127.0.0.1:{}".format(cls.server.server_port)
+        cls.thread = threading.Thread(target=cls.server.serve_forever,
+                                      daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the stub server and drop pooled connections to it."""
+        cls.server.shutdown()
+        cls.server.server_close()
+        reset_session()
+
+    def setUp(self):
+        """Fresh session, cache and request log for every test."""
+        reset_session()
+        conditional_cache.clear()
+        self.server.requests = []
+        self.server.client_ports = set()
+
+    @parameterized.expand([
+        ("/etag", "If-None-Match", '"v1"'),
+        ("/last-modified", "If-Modified-Since",
+         "Wed, 21 Oct 2015 07:28:00 GMT"),
+    ])
+    def test_not_modified_served_from_cache(self, path, header, value):
+        """Second call is conditional and its 304 returns the cached body."""
+        url = self.base_url + path
+        first = get_json(url)
+        second = get_json(url)
+
+        self.assertEqual(first, StubHandler.payload)
+        self.assertEqual(second, StubHandler.payload)
+        self.assertNotIn(header, self.server.requests[0])
+        self.assertEqual(self.server.requests[1].get(header), value)
+        self.assertEqual(conditional_cache.hits, 1)
+
+    def test_revalidated_pages_keep_their_links(self):
+        """A 304 answers with the cached Link and its own fresh headers."""
+        def walk():
+            """Repos of every page, following rel="next"."""
+            url, repos, served = self.base_url + "/pages/1", [], []
+            while url:
+                payload, headers = get_json_with_headers(url)
+                repos.extend(payload)
+                served.append(headers["x-served"])
+                url = parse_links(headers.get("Link")).get("next")
+            return repos, served
+
+        self.assertEqual(walk(), (["r1", "r2"], ["1", "2"]))
+        self.assertEqual(walk(), (["r1", "r2"], ["3", "4"]))
+        self.assertEqual(conditional_cache.hits, 2)
+
+    def test_stream_json(self):
+        """stream_json yields the served array element by element."""
+        headers = {}
+        items = stream_json(self.base_url + "/stream", chunk_size=4,
+                            on_headers=headers.update)
+        self.assertEqual(list(items), StubHandler.payload["repos"])
+        self.assertEqual(headers["Content-Type"], "application/json")
+
+    def test_connection_is_reused(self):
+        """Sequential calls share one keep-alive connection."""
+        for _ in range(5):
+            get_json(self.base_url + "/etag")
+
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+
 class TestMemoize(unittest.TestCase):
     """Unit tests for the memoize decorator."""
 
@@ -81,5 +362,96 @@ class TestMemoize(unittest.TestCase):
             mock_method.assert_called_once()
 
 
+class TestMemoizeTTL(unittest.TestCase):
+    """Unit tests for the memoize_ttl decorator."""
+
+    def setUp(self):
+        """Start every test with an empty shared cache."""
+        shared_cache.clear()
+
+    @staticmethod
+    def make_class(ttl=None, key=None):
+        """Build a class whose memoized property counts its computations."""
+
+        class TestClass:
+            """Helper class to test memoize_ttl."""
+
+            def __init__(self, name="a"):
+                """Init method of TestClass"""
+                self.name = name
+                self.calls = 0
+
+            @memoize_ttl(ttl=ttl, key=key)
+            def a_property(self):
+                """Memoized property that counts its calls."""
+                self.calls += 1
+                return [self.name, self.calls]
+
+        return TestClass
+
+    def test_expires_after_ttl(self):
+        """Value is recomputed once the ttl has elapsed."""
+        obj = self.make_class(ttl=10)()
+        with patch("utils.time.monotonic", return_value=100.0):
+            self.assertEqual(obj.a_property, ["a", 1])
+            self.assertEqual(obj.a_property, ["a", 1])
+        with patch("utils.time.monotonic", return_value=111.0):
+            self.assertEqual(obj.a_property, ["a", 2])
+
+    def test_invalidate(self):
+        """invalidate() forces the next access to recompute."""
+        cls = self.make_class()
+        obj = cls()
+        obj.a_property
+        cls.a_property.invalidate(obj)
+        self.assertEqual(obj.a_property, ["a", 2])
+
+    def test_computes_once_under_concurrency(self):
+        """Threads racing on a cold instance share one computation."""
+        cls = self.make_class()
+        obj = cls()
+        started = threading.Barrier(8)
+        results = []
+
+        def slow_fn(instance):
+            """Slow enough for every thread to arrive while computing."""
+            instance.calls += 1
+            time.sleep(0.05)
+            return instance.calls
+
+        cls.a_property._fn = slow_fn
+
+        def worker():
+            """Hit the property at the same moment as the others."""
+            started.wait()
+            results.append(obj.a_property)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [1] * 8)
+        self.assertEqual(obj.calls, 1)
+
+    def test_shared_between_instances_with_same_key(self):
+        """Instances with the same key reuse one cached value."""
+        cls = self.make_class(key=lambda self: self.name)
+        first, second, other = cls("a"), cls("a"), cls("b")
+
+        self.assertIs(first.a_property, second.a_property)
+        self.assertEqual(second.calls, 0)
+        self.assertEqual(other.a_property, ["b", 1])
+
+    def test_none_key_keeps_cache_per_instance(self):
+        """A key of None falls back to a per-instance cache."""
+        cls = self.make_class(key=lambda self: None)
+        first, second = cls(), cls()
+        first.a_property
+        second.a_property
+        self.assertEqual((first.calls, second.calls), (1, 1))
+
+
 if __name__ == "__main__":
     unittest.main()
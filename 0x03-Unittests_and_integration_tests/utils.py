@@ -1,7 +1,17 @@
 #!/usr/bin/env python3
 """Generic utilities for github org client.
 """
+import codecs
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import parse_header_links
 from functools import wraps
 from typing import (
     Mapping,
@@ -9,14 +19,40 @@ from typing import (
     Any,
     Dict,
     Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
 )
 
 __all__ = [
     "access_nested_map",
+    "compile_path",
+    "extract_many",
     "get_json",
+    "get_json_with_headers",
+    "iter_json_array",
+    "stream_json",
+    "parse_links",
+    "page_url",
+    "get_session",
+    "reset_session",
+    "ConditionalCache",
+    "conditional_cache",
     "memoize",
+    "memoize_ttl",
+    "TTLCache",
+    "shared_cache",
 ]
 
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 32
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
 
 def access_nested_map(nested_map: Mapping, path: Sequence) -> Any:
     """Access nested map with key path.
@@ -40,11 +76,390 @@ def access_nested_map(nested_map: Mapping, path: Sequence) -> Any:
     return nested_map
 
 
+_RAISE = object()
+
+
+def compile_path(path: Sequence, default: Any = _RAISE) -> Callable:
+    """Compile a key path into a getter equivalent to access_nested_map.
+    Paths of string keys are read with plain chained subscripts, with no
+    per-key loop or isinstance check; anything unusual (a missing key, a
+    non-mapping on the way) falls back to access_nested_map so the result
+    and the KeyError are the same as calling it directly.
+    Parameters
+    ----------
+    path: Sequence
+        a sequence of key representing a path to the value
+    default: Any, optional
+        returned instead of raising KeyError when the path is missing
+    Example
+    -------
+    >>> get_license = compile_path(("license", "key"), default=None)
+    >>> get_license({"license": {"key": "mit"}})
+    'mit'
+    >>> get_license({"license": None}) is None
+    True
+    """
+    keys = tuple(path)
+
+    def fallback(nested_map: Mapping) -> Any:
+        try:
+            return access_nested_map(nested_map, keys)
+        except KeyError:
+            if default is _RAISE:
+                raise
+            return default
+
+    if not keys or not all(isinstance(key, str) for key in keys):
+        # non-string keys could index sequences, keep the exact semantics
+        return fallback
+
+    misses = (KeyError, TypeError, IndexError)
+    if len(keys) == 1:
+        (k0,) = keys
+
+        def getter(nested_map: Mapping) -> Any:
+            try:
+                return nested_map[k0]
+            except misses:
+                return fallback(nested_map)
+    elif len(keys) == 2:
+        k0, k1 = keys
+
+        def getter(nested_map: Mapping) -> Any:
+            try:
+                return nested_map[k0][k1]
+            except misses:
+                return fallback(nested_map)
+    elif len(keys) == 3:
+        k0, k1, k2 = keys
+
+        def getter(nested_map: Mapping) -> Any:
+            try:
+                return nested_map[k0][k1][k2]
+            except misses:
+                return fallback(nested_map)
+    else:
+        def getter(nested_map: Mapping) -> Any:
+            try:
+                value = nested_map
+                for key in keys:
+                    value = value[key]
+                return value
+            except misses:
+                return fallback(nested_map)
+
+    return getter
+
+
+def extract_many(records: Sequence[Mapping], paths: Sequence[Sequence],
+                 default: Any = None) -> List[List[Any]]:
+    """Pull several paths out of every record in one pass, as columns.
+    Missing paths give default.
+    Example
+    -------
+    >>> repos = [{"name": "a", "license": {"key": "mit"}}, {"name": "b"}]
+    >>> extract_many(repos, [("name",), ("license", "key")])
+    [['a', 'b'], ['mit', None]]
+    """
+    getters = [compile_path(path, default) for path in paths]
+    columns: List[List[Any]] = [[] for _ in getters]
+    plan = [(getter, column.append)
+            for getter, column in zip(getters, columns)]
+    for record in records:
+        for getter, append in plan:
+            append(getter(record))
+    return columns
+
+
+def _new_session(pool_connections: int, pool_maxsize: int) -> requests.Session:
+    """Build a keep-alive session with sized connection pools."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session used by get_json.
+    Reusing one session keeps TCP/TLS connections alive between calls
+    instead of handshaking on every request.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _new_session(POOL_CONNECTIONS, POOL_MAXSIZE)
+    return _session
+
+
+def reset_session(pool_connections: int = POOL_CONNECTIONS,
+                  pool_maxsize: int = POOL_MAXSIZE) -> requests.Session:
+    """Close the shared session and replace it with a freshly sized one.
+    Parameters
+    ----------
+    pool_connections: int
+        number of per-host connection pools to keep
+    pool_maxsize: int
+        maximum number of connections kept alive per host
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = _new_session(pool_connections, pool_maxsize)
+    return _session
+
+
+class ConditionalCache:
+    """Bounded LRU of JSON payloads keyed by URL, with their validators.
+    Only 200 responses carrying an ETag or Last-Modified header are kept,
+    so the next request for the URL can be made conditional; an error
+    body is never replayed for a 304. The response
+    headers are kept too, a 304 does not repeat Link and friends.
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        """Init method of ConditionalCache"""
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[Dict[str, str], Any, Dict]]" \
+            = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """Conditional request headers for a cached URL, if any."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return {}
+            self._entries.move_to_end(url)
+            validators = entry[0]
+        headers = {}
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def get(self, url: str) -> Tuple[Any, Mapping]:
+        """Cached (payload, headers) for url; KeyError when not cached.
+        The headers are a copy, case-insensitive like requests' own.
+        """
+        with self._lock:
+            _, payload, headers = self._entries[url]
+            self.hits += 1
+        return payload, headers.copy()
+
+    def store(self, url: str, headers: Mapping, payload: Any,
+              status: int = 200) -> None:
+        """Remember payload if it is a 200 whose headers carry a validator.
+        Other statuses leave an earlier entry for url in place.
+        """
+        if status != 200:
+            with self._lock:
+                self.misses += 1
+            return
+        validators = {}
+        if headers.get("ETag"):
+            validators["etag"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            validators["last_modified"] = headers["Last-Modified"]
+        with self._lock:
+            self.misses += 1
+            if not validators:
+                self._entries.pop(url, None)
+                return
+            self._entries[url] = (validators, payload,
+                                  CaseInsensitiveDict(headers))
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        """Number of cached URLs"""
+        return len(self._entries)
+
+
+conditional_cache = ConditionalCache()
+
+
+def get_json_with_headers(url: str) -> Tuple[Any, Mapping]:
+    """Get JSON from remote URL along with the response headers.
+    See get_json_response.
+    """
+    return get_json_response(url)[:2]
+
+
+def get_json_response(url: str
+                      ) -> Tuple[Any, Mapping, requests.Response]:
+    """Get JSON from remote URL, its headers and the response received.
+    Goes through the shared keep-alive session. A URL fetched before with
+    an ETag/Last-Modified is requested conditionally and a
+    304 Not Modified is answered from the cached payload, with the cached
+    headers updated by those of the 304 (fresh rate-limit headers, say).
+    """
+    headers = conditional_cache.request_headers(url)
+    response = get_session().get(url, headers=headers)
+    if response.status_code == 304 and headers:
+        try:
+            payload, cached_headers = conditional_cache.get(url)
+            cached_headers.update(response.headers)
+            return payload, cached_headers, response
+        except KeyError:
+            # evicted between the two lookups, fetch it unconditionally
+            response = get_session().get(url, headers={})
+    payload = response.json()
+    conditional_cache.store(url, response.headers, payload,
+                            response.status_code)
+    return payload, response.headers, response
+
+
 def get_json(url: str) -> Dict:
     """Get JSON from remote URL.
     """
-    response = requests.get(url)
-    return response.json()
+    return get_json_with_headers(url)[0]
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+def iter_json_array(chunks: Iterable[bytes],
+                    paths: Optional[Sequence[Sequence]] = None) -> Iterator:
+    """Incrementally decode a top-level JSON array from UTF-8 byte chunks.
+    Elements are yielded one at a time as soon as they are complete, so
+    only the element being decoded and the current chunk are held in
+    memory, however long the array is.
+    Parameters
+    ----------
+    chunks: Iterable[bytes]
+        the body, e.g. response.iter_content(chunk_size)
+    paths: Sequence, optional
+        when given, yield a tuple with the value at each path (None when
+        missing) instead of the whole element
+    Example
+    -------
+    >>> list(iter_json_array([b'[{"a": 1}, {"a"', b': 2}]'], [("a",)]))
+    [(1,), (2,)]
+    """
+    getters = None
+    if paths is not None:
+        getters = [compile_path(path, default=None) for path in paths]
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    source = iter(chunks)
+    buffer, pos, done = "", 0, False
+
+    def fill() -> bool:
+        """Append the next chunk to the unread text; False at the end."""
+        nonlocal buffer, pos, done
+        if done:
+            return False
+        chunk = next(source, None)
+        if chunk is None:
+            done = True
+            text = decoder.decode(b"", final=True)
+        else:
+            text = decoder.decode(chunk)
+        buffer, pos = buffer[pos:] + text, 0
+        return True
+
+    state = "start"
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if fill():
+                continue
+            if state == "end":
+                return
+            raise ValueError("truncated JSON array")
+        char = buffer[pos]
+        if state == "end":
+            raise ValueError("unexpected data after JSON array")
+        if state == "start":
+            if char != "[":
+                raise ValueError("expected a JSON array")
+            pos += 1
+            state = "first"
+        elif state == "separator":
+            if char not in ",]":
+                raise ValueError("expected ',' or ']' in JSON array")
+            pos += 1
+            state = "value" if char == "," else "end"
+        elif state == "first" and char == "]":
+            pos += 1
+            state = "end"
+        else:
+            while True:
+                try:
+                    value, end = _DECODER.raw_decode(buffer, pos)
+                    # a number at the very end of the buffer may go on
+                    if end < len(buffer) or done:
+                        break
+                except json.JSONDecodeError:
+                    if done:
+                        raise
+                fill()
+            pos = end
+            state = "separator"
+            if getters is None:
+                yield value
+            else:
+                yield tuple(getter(value) for getter in getters)
+
+
+def stream_json(url: str, paths: Optional[Sequence[Sequence]] = None,
+                chunk_size: int = 65536,
+                on_headers: Optional[Callable[[Mapping], None]] = None
+                ) -> Iterator:
+    """Stream the elements of a JSON array served at url.
+    The body is decoded while it downloads (see iter_json_array) instead
+    of being buffered whole by response.json(). on_headers, when given,
+    is called with the response headers before the first element.
+    """
+    response = get_session().get(url, stream=True)
+    try:
+        if on_headers is not None:
+            on_headers(response.headers)
+        yield from iter_json_array(response.iter_content(chunk_size), paths)
+    finally:
+        response.close()
+
+
+def parse_links(link_header: Optional[str]) -> Dict[str, str]:
+    """Map the rel names of an RFC 8288 Link header to their URLs.
+    Example
+    -------
+    >>> parse_links('<https://x/repos?page=2>; rel="next"')
+    {'next': 'https://x/repos?page=2'}
+    """
+    if not link_header:
+        return {}
+    return {
+        link["rel"]: link["url"]
+        for link in parse_header_links(link_header)
+        if "rel" in link
+    }
+
+
+def page_url(url: str, page: int) -> str:
+    """Return url with its ``page`` query parameter set to page."""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query)
+             if key != "page"]
+    query.append(("page", str(page)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
 
 
 def memoize(fn):
@@ -58,3 +473,138 @@ def memoize(fn):
         return getattr(self, attr)
 
     return wrapper
+
+
+class TTLCache:
+    """Thread-safe cache whose entries expire after a time-to-live.
+    Each key has its own lock, so concurrent callers asking for the same
+    missing key wait for a single computation instead of all running it.
+    """
+
+    def __init__(self) -> None:
+        """Init method of TTLCache"""
+        self._entries: Dict[Hashable, Tuple[Any, Optional[float]]] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, key: Hashable) -> Tuple[bool, Any]:
+        """(True, value) when key holds an unexpired entry."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            return False, None
+        return True, value
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any],
+                       ttl: Optional[float] = None) -> Any:
+        """Return the cached value for key, computing it once if needed.
+        Parameters
+        ----------
+        key: Hashable
+            cache key
+        compute: Callable
+            called without arguments to produce a missing/expired value
+        ttl: float, optional
+            seconds the computed value stays valid, None for forever
+        """
+        found, value = self._fresh(key)
+        if found:
+            self.hits += 1
+            return value
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # another thread may have filled it while we waited
+            found, value = self._fresh(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            value = compute()
+            expires_at = None if ttl is None else time.monotonic() + ttl
+            self._entries[key] = (value, expires_at)
+            return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Forget key so the next lookup recomputes it."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Forget every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+shared_cache = TTLCache()
+
+
+class _TTLMemoized(property):
+    """Property produced by memoize_ttl."""
+
+    def __init__(self, fn: Callable, ttl: Optional[float],
+                 key: Optional[Callable[[Any], Hashable]]) -> None:
+        """Init method of _TTLMemoized"""
+        super().__init__(self._get, doc=fn.__doc__)
+        self._fn = fn
+        self._ttl = ttl
+        self._key = key
+        self._attr = "_{}_cache".format(fn.__name__)
+        self._name = "{}.{}".format(fn.__module__, fn.__qualname__)
+
+    def _locate(self, instance: Any) -> Tuple[TTLCache, Hashable]:
+        """Pick the shared or the per-instance cache and the key in it."""
+        shared_key = self._key(instance) if self._key is not None else None
+        if shared_key is not None:
+            return shared_cache, (self._name, shared_key)
+        cache = instance.__dict__.get(self._attr)
+        if cache is None:
+            # setdefault keeps a single cache when two threads race here
+            cache = instance.__dict__.setdefault(self._attr, TTLCache())
+        return cache, self._name
+
+    def _get(self, instance: Any) -> Any:
+        """Cached value of the wrapped method for instance."""
+        cache, key = self._locate(instance)
+        return cache.get_or_compute(key, lambda: self._fn(instance),
+                                    self._ttl)
+
+    def invalidate(self, instance: Any) -> None:
+        """Drop the value cached for instance (shared or not)."""
+        cache, key = self._locate(instance)
+        cache.invalidate(key)
+
+
+def memoize_ttl(ttl: Optional[float] = None,
+                key: Optional[Callable[[Any], Hashable]] = None) -> Callable:
+    """Decorator like memoize, with expiry, compute-once and sharing.
+    Parameters
+    ----------
+    ttl: float, optional
+        seconds before the cached value is recomputed, None for never
+    key: Callable, optional
+        key(self) -> hashable. When it returns a value, the result is
+        kept in the process-wide shared_cache under (method, value), so
+        every instance with the same key shares it. When it is missing
+        or returns None, the result is cached on the instance.
+    Example
+    -------
+    >>> class Client:
+    ...     @memoize_ttl(ttl=60)
+    ...     def payload(self):
+    ...         return {"fetched": True}
+    >>> client = Client()
+    >>> client.payload is client.payload
+    True
+    >>> Client.payload.invalidate(client)
+    """
+    def decorator(fn: Callable) -> _TTLMemoized:
+        return _TTLMemoized(fn, ttl, key)
+
+    return decorator
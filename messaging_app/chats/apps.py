@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ChatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chats'
+
+    def ready(self):
+        """
+        Import signals when the app is ready so their receivers connect
+        """
+        import chats.signals  # noqa: F401
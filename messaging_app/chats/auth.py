@@ -1,11 +1,132 @@
+"""
+Authentication for the chats API.
+
+simplejwt's JWTAuthentication.get_user reads the user from the database on
+every request. CustomJWTAuthentication keeps the users it resolved in
+UserCache instead: a small in-process LRU with a short TTL in front of
+the shared Django cache, so most authenticated requests run no auth query.
+
+Shared entries are stored under the user's current cache version, a
+random token kept in the Django cache. invalidate_user() replaces it,
+which orphans every shared entry of the user at once; the signals in
+chats.signals call it whenever a user is saved (a password change, or a
+deactivation for user models that have is_active) or deleted. Other processes may keep serving their local copy
+for up to CHATS_AUTH_LOCAL_TTL seconds. Changes made with
+QuerySet.update() send no signal and need an explicit invalidate_user().
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth.models import User
 
+VERSION_KEY = "chats:auth:version:{}"
+USER_KEY = "chats:auth:user:{}"
+
+
+class UserCache:
+    """
+    Users by id: an in-process LRU (local_size entries for local_ttl
+    seconds), then the shared cache (shared_ttl seconds)
+    """
+
+    def __init__(self, local_size=None, local_ttl=None, shared_ttl=None):
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _setting(self, value, name, default):
+        return value if value is not None else getattr(settings, name, default)
+
+    def fetch(self, user_id, load):
+        """
+        The cached user with this id, else load() (which reads the
+        database) and cache it. Callers get their own copy.
+        """
+        user_id = str(user_id)  # token claims and pks may differ in type
+        user = self._get_local(user_id)
+        if user is None:
+            version_key, user_key = VERSION_KEY.format(user_id), USER_KEY.format(user_id)
+            found = cache.get_many([version_key, user_key])
+            version = found.get(version_key)
+            if version is None:
+                cache.add(version_key, uuid.uuid4().hex, None)
+                version = cache.get(version_key)
+            entry = found.get(user_key)
+            if entry is not None and entry[0] == version:
+                user = entry[1]
+            else:
+                # stored under the version seen before reading: if the user
+                # changes meanwhile, the entry is already stale
+                user = load()
+                cache.set(user_key, (version, user),
+                          self._setting(self.shared_ttl, "CHATS_AUTH_CACHE_TTL", 300))
+            self._set_local(user_id, user)
+        return copy.copy(user)
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires <= time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return user
+
+    def _set_local(self, user_id, user):
+        ttl = self._setting(self.local_ttl, "CHATS_AUTH_LOCAL_TTL", 5)
+        if not ttl:
+            return
+        size = self._setting(self.local_size, "CHATS_AUTH_LOCAL_SIZE", 1024)
+        with self._lock:
+            self._local[user_id] = (time.monotonic() + ttl, user)
+            self._local.move_to_end(user_id)
+            while len(self._local) > size:
+                self._local.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """
+        Forget the user here and, through a new version, everywhere
+        """
+        user_id = str(user_id)
+        cache.set(VERSION_KEY.format(user_id), uuid.uuid4().hex, None)
+        with self._lock:
+            self._local.pop(user_id, None)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+
+user_cache = UserCache()
+
+
+def invalidate_user(user_id):
+    """
+    Make every process read the user from the database again
+    """
+    user_cache.invalidate(user_id)
+
+
 class CustomJWTAuthentication(JWTAuthentication):
     """
     Custom JWT authentication class to handle user authentication with JWT tokens.
+    Users are resolved through user_cache rather than one query per request.
     """
     def authenticate(self, request):
         try:
@@ -27,6 +148,35 @@ class CustomJWTAuthentication(JWTAuthentication):
         except Exception as e:
             raise AuthenticationFailed('Invalid token')
 
+    def get_user(self, validated_token):
+        """
+        The token's user from user_cache; a cached user passes the same
+        active and revoked-password checks as one read from the database
+        """
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)
+        user = user_cache.fetch(user_id, partial(self.load_user, user_id))
+        # chats.User has no is_active: its users are all active
+        if api_settings.CHECK_USER_IS_ACTIVE and not getattr(user, 'is_active', True):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
+
+    def load_user(self, user_id):
+        """
+        The user with the token's id from the database
+        """
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+
 class CustomSessionAuthentication(SessionAuthentication):
     """
     Custom session authentication for browser-based API access.
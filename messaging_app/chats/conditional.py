@@ -0,0 +1,102 @@
+"""
+Conditional GETs for the chats endpoints.
+
+Clients poll GET /conversations/ and GET /conversations/{id}/messages/.
+Both responses only change when a conversation's version changes (see
+chats.summaries), so the validators come from Conversation.version and
+updated_at in one indexed query, before anything is serialized. A request
+whose If-None-Match / If-Modified-Since still matches gets a
+304 Not Modified straight away.
+
+HTTP dates have whole seconds, so Last-Modified is only sent once the
+second of the last change is over: a later change then always falls in a
+later second than the date the client sends back. The inbox sends no
+Last-Modified at all, its latest updated_at goes back when the user
+leaves a conversation; its ETag covers that.
+"""
+import hashlib
+import time
+import uuid
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date, quote_etag
+
+from .models import Conversation
+
+
+def make_etag(request, *parts):
+    """
+    ETag of a response for this user and this exact URL (page, cursor and
+    filters change the body) at the given state
+    """
+    key = "|".join(str(part) for part in (request.user.pk, request.get_full_path(), *parts))
+    return quote_etag(hashlib.sha1(key.encode()).hexdigest())
+
+
+def conversation_validators(request, conversation_id):
+    """
+    (etag, last_modified) of one conversation's views, or None when the
+    user is not a participant (the normal path then answers 403/404).
+    The participant join doubles as the permission check. A pk that is
+    not a UUID gives None too, get_object() answers it with a 404.
+    """
+    try:
+        conversation_id = uuid.UUID(str(conversation_id))
+    except ValueError:
+        return None
+    # a slice, not .first(): that would order the single row by pk
+    rows = (
+        Conversation.objects.filter(pk=conversation_id, participants=request.user)
+        .values_list("version", "updated_at")[:1]
+    )
+    if not rows:
+        return None
+    version, updated_at = rows[0]
+    return make_etag(request, conversation_id, version), updated_at
+
+
+def inbox_validators(request):
+    """
+    (etag, None) of the user's conversation list: any change to one of
+    them bumps the version sum and updated_at, joining or leaving one
+    changes the count. Only the ETag can tell, see the module docstring.
+    """
+    state = Conversation.objects.filter(participants=request.user).aggregate(
+        count=Count("pk"), versions=Sum("version"), updated_at=Max("updated_at")
+    )
+    etag = make_etag(request, state["count"], state["versions"], state["updated_at"])
+    return etag, None
+
+
+def not_modified(request, validators):
+    """
+    304 response when the request's validators still match, else None
+    """
+    if validators is None:
+        return None
+    etag, updated_at = validators
+    return get_conditional_response(
+        request._request if hasattr(request, "_request") else request,
+        etag=etag,
+        last_modified=int(updated_at.timestamp()) if updated_at else None,
+    )
+
+
+def set_validators(response, validators):
+    """
+    Send the validators with a full response so the next poll can be
+    conditional; it is per user, so only private caches may keep it
+    """
+    if validators is None:
+        return response
+    etag, updated_at = validators
+    response["ETag"] = etag
+    if updated_at and int(updated_at.timestamp()) + 1 <= time.time():
+        # the second is over, no change can share its date any more
+        response["Last-Modified"] = http_date(updated_at.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Authorization", "Cookie"))
+    return response
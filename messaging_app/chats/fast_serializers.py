@@ -0,0 +1,281 @@
+"""
+Read-only fast path for the chats list endpoints.
+
+ModelSerializer builds its fields per instance and walks every attribute
+through a Field.to_representation call. For list responses that only
+read, this module produces the same JSON from .values_list() rows
+instead: a FieldPlan names the columns once and compiles a function that
+turns a row tuple into the output dict, with the converters bound in
+advance. No model instances are built.
+
+The shapes mirror MessageSerializer and ConversationListSerializer, also
+when narrowed or expanded by a chats.fieldsets.Fieldset; the tests
+compare the rendered JSON of both paths.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .models import Conversation, Message
+
+
+def _uuid(value):
+    return None if value is None else str(value)
+
+
+def _full_name(first_name, last_name):
+    # same text as User.__str__, which StringRelatedField renders
+    return f"{first_name} {last_name}"
+
+
+def _user(user_id, first_name, last_name):
+    # same shape as UserSummarySerializer, for expanded users
+    if user_id is None:
+        return None
+    return {"user_id": str(user_id), "first_name": first_name, "last_name": last_name}
+
+
+def datetime_converter():
+    """
+    DRF DateTimeField.to_representation for the current settings, with
+    the timezone and format looked up once instead of per value
+    """
+    if api_settings.DATETIME_FORMAT != ISO_8601:
+        return serializers.DateTimeField().to_representation
+    zone = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def convert(value):
+        if value is None:
+            return None
+        if zone is not None and timezone.is_aware(value):
+            value = value.astimezone(zone)
+        text = value.isoformat()
+        if text.endswith("+00:00"):
+            text = text[:-6] + "Z"
+        return text
+    return convert
+
+
+class FieldPlan:
+    """
+    Compiled mapping from .values_list() columns to output dicts.
+
+    fields is a sequence of (key, columns, converter): the output key,
+    the columns it is built from and a function called with their values
+    (None to copy a single column as is). A field without columns is a
+    placeholder filled in later, it only fixes the key order.
+    """
+
+    def __init__(self, fields, expand=()):
+        self.keys = [key for key, _, _ in fields]
+        self.expand = frozenset(expand)
+        self.columns = []
+        for _, columns, _ in fields:
+            for column in columns:
+                if column not in self.columns:
+                    self.columns.append(column)
+        self._fields = fields
+        self._build = None
+
+    def compile(self):
+        """
+        Generate `def build(row): return {...}` with the row indexes inlined
+        """
+        namespace = {}
+        items = []
+        for number, (key, columns, converter) in enumerate(self._fields):
+            args = ", ".join(f"row[{self.columns.index(column)}]" for column in columns)
+            if not columns:
+                expression = "None"
+            elif converter is None:
+                expression = args
+            else:
+                namespace[f"c{number}"] = converter
+                expression = f"c{number}({args})"
+            items.append(f"{key!r}: {expression}")
+        source = "def build(row):\n    return {" + ", ".join(items) + "}\n"
+        exec(compile(source, f"<FieldPlan {self.keys}>", "exec"), namespace)
+        return namespace["build"]
+
+    def values(self, queryset, *extra):
+        """
+        queryset as named row tuples: the plan's columns, then the extra
+        ones it lacks (e.g. search_rank, or the keys the paginators read),
+        readable by attribute
+        """
+        extra = [column for column in dict.fromkeys(extra) if column not in self.columns]
+        return queryset.prefetch_related(None).values_list(*self.columns, *extra, named=True)
+
+    def only(self, queryset, *extra):
+        """
+        queryset narrowed to the plan's columns (plus extra) for the
+        ModelSerializer path, joining only the relations they go through
+        """
+        columns = [*self.columns, *extra]
+        related = {column.rpartition("__")[0] for column in columns if "__" in column}
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+    def render(self, rows):
+        if self._build is None:
+            self._build = self.compile()
+        build = self._build
+        return [build(row) for row in rows]
+
+
+def _message_fields(to_datetime):
+    """
+    (fields, expanded) of MessageSerializer's output
+    """
+    return [
+        ("message_id", ("message_id",), _uuid),
+        ("conversation", ("conversation_id",), _uuid),
+        ("sender", ("sender__first_name", "sender__last_name"), _full_name),
+        ("message_body", ("message_body",), None),
+        ("sent_at", ("sent_at",), to_datetime),
+    ], {
+        "sender": (("sender_id", "sender__first_name", "sender__last_name"), _user),
+    }
+
+
+def _conversation_fields(to_datetime):
+    """
+    (fields, expanded) of ConversationListSerializer's output
+    """
+    return [
+        ("conversation_id", ("conversation_id",), _uuid),
+        ("participants", (), None),
+        ("messages", (), None),
+        ("created_at", ("created_at",), to_datetime),
+        ("last_message_at", ("last_message_at",), to_datetime),
+        ("last_message_preview", ("last_message_preview",), None),
+        ("message_count", ("message_count",), None),
+        ("last_sender", ("last_sender_id",), _uuid),
+    ], {
+        "participants": ((), None),
+        "last_sender": (
+            ("last_sender_id", "last_sender__first_name", "last_sender__last_name"), _user
+        ),
+    }
+
+
+def _datetime_settings():
+    # what datetime_converter() depends on
+    zone = timezone.get_current_timezone_name() if settings.USE_TZ else None
+    return api_settings.DATETIME_FORMAT, zone
+
+
+@lru_cache(maxsize=256)
+def _plan(shape, keys, expand, datetime_settings):
+    """
+    Compiled FieldPlan of shape narrowed to keys (None for all of them),
+    built once per distinct narrowing and datetime settings
+    """
+    fields, expanded = shape(datetime_converter())
+    chosen = []
+    for key, columns, converter in fields:
+        if keys is None or key in keys:
+            if key in expand:
+                columns, converter = expanded[key]
+            chosen.append((key, columns, converter))
+    plan = FieldPlan(chosen, expand)
+    # compiled here so that requests sharing the plan never compile it
+    plan._build = plan.compile()
+    return plan
+
+
+def _narrow(shape, fieldset, nestable=()):
+    """
+    FieldPlan of the fields the fieldset asks for, with the expanded
+    (columns, converter) of the ones it expands
+    """
+    if fieldset is None or fieldset.is_full:
+        return _plan(shape, None, frozenset(), _datetime_settings())
+    fields, expanded = shape(None)
+    keys = fieldset.select([key for key, _, _ in fields], expanded, nestable)
+    return _plan(
+        shape, tuple(keys), fieldset.expand & set(keys), _datetime_settings()
+    )
+
+
+def message_plan(fieldset=None):
+    """
+    Plan of MessageSerializer's output, narrowed to a chats.fieldsets.Fieldset
+    """
+    return _narrow(_message_fields, fieldset)
+
+
+def conversation_plan(fieldset=None):
+    """
+    Plan of ConversationListSerializer's output, narrowed to a Fieldset;
+    participants and messages are filled in by render_conversations
+    """
+    return _narrow(_conversation_fields, fieldset, nestable=("messages",))
+
+
+def render_messages(rows, plan=None):
+    """
+    Output of MessageSerializer(many=True) for rows of message_plan().values()
+    """
+    return (plan or message_plan()).render(rows)
+
+
+def render_conversations(rows, recent_limit, plan=None, messages=None):
+    """
+    Output of ConversationListSerializer(many=True) for rows of
+    conversation_plan().values(..., "conversation_id"): participants and
+    the last recent_limit messages of every conversation take one query
+    each, and none when the plan leaves them out
+    """
+    plan = plan or conversation_plan()
+    messages = messages or message_plan()
+    data = plan.render(rows)
+    by_id = {}
+    for row, item in zip(rows, data):
+        by_id[row.conversation_id] = item
+        if "participants" in plan.keys:
+            item["participants"] = []
+        if "messages" in plan.keys:
+            item["messages"] = []
+    if not data:
+        return data
+
+    if "participants" in plan.keys:
+        participants = (
+            Conversation.participants.through.objects
+            .filter(conversation_id__in=list(by_id))
+            .order_by("user__first_name", "user__last_name", "user_id")
+            .values_list("conversation_id", "user_id", "user__first_name", "user__last_name")
+        )
+        expand = "participants" in plan.expand
+        for conversation_id, user_id, first_name, last_name in participants:
+            by_id[conversation_id]["participants"].append(
+                _user(user_id, first_name, last_name) if expand
+                else _full_name(first_name, last_name)
+            )
+
+    if "messages" in plan.keys:
+        recent = (
+            Message.objects.filter(conversation_id__in=list(by_id))
+            .annotate(position=Window(
+                RowNumber(),
+                partition_by=[F("conversation_id")],
+                order_by=[F("sent_at").desc(), F("message_id").desc()],
+            ))
+            .filter(position__lte=recent_limit)
+            .order_by()
+        )
+        # at most recent_limit rows per conversation: put them in order here
+        # rather than have the database sort the window's output
+        message_rows = sorted(messages.values(recent, "conversation_id", "position"),
+                              key=lambda row: row.position)
+        for row, item in zip(message_rows, messages.render(message_rows)):
+            by_id[row.conversation_id]["messages"].append(item)
+    return data
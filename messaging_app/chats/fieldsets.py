@@ -0,0 +1,102 @@
+"""
+Sparse fieldsets and expansion for the chats read endpoints.
+
+?fields=message_id,sent_at keeps only the named fields of each result;
+nested fields take a dotted prefix, e.g. on conversations
+?fields=conversation_id,messages.message_id,messages.sent_at. Naming a
+nested field alone (?fields=messages) keeps all of its own fields.
+
+?expand=sender replaces a related user's display name (or id) with a
+{user_id, first_name, last_name} object; on conversations participants
+and last_sender expand, and messages.sender expands the embedded
+messages' senders.
+
+Fields that are not requested are not read either: the fast plans in
+chats.fast_serializers drop their columns and joins, and the viewsets
+narrow their querysets with .only() and skip the matching prefetches.
+"""
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def _names(value):
+    return [name.strip() for name in value.split(",") if name.strip()] if value else []
+
+
+class Fieldset:
+    """
+    The fields and expansions requested for one level of a response;
+    fields is None when every field is wanted
+    """
+
+    def __init__(self, fields=None, expand=(), nested=None):
+        self.fields = fields
+        self.expand = frozenset(expand)
+        self._nested = nested or {}
+
+    @classmethod
+    def parse(cls, fields=None, expand=None):
+        """
+        Fieldset from the comma separated ?fields= and ?expand= values
+        """
+        top, nested_fields = None, {}
+        if fields:
+            top = set()
+            for name in _names(fields):
+                head, _, rest = name.partition(".")
+                top.add(head)
+                if rest:
+                    nested_fields.setdefault(head, set()).add(rest)
+        top_expand, nested_expand = set(), {}
+        for name in _names(expand):
+            head, _, rest = name.partition(".")
+            if rest:
+                nested_expand.setdefault(head, set()).add(rest)
+            else:
+                top_expand.add(head)
+        nested = {
+            head: cls(nested_fields.get(head), nested_expand.get(head, ()))
+            for head in set(nested_fields) | set(nested_expand)
+        }
+        return cls(top, top_expand, nested)
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Fieldset of a request, memoized on it
+        """
+        fieldset = getattr(request, "_chats_fieldset", None)
+        if fieldset is None:
+            params = request.query_params
+            fieldset = cls.parse(params.get(FIELDS_PARAM), params.get(EXPAND_PARAM))
+            request._chats_fieldset = fieldset
+        return fieldset
+
+    @property
+    def is_full(self):
+        return self.fields is None and not self.expand and not self._nested
+
+    def nested(self, name):
+        """
+        Fieldset of the nested field name
+        """
+        return self._nested.get(name) or Fieldset()
+
+    def wants(self, name):
+        return self.fields is None or name in self.fields
+
+    def select(self, available, expandable=(), nestable=()):
+        """
+        The names of available (in their order) to output; unknown fields,
+        expansions or nested names are a 400
+        """
+        unknown = sorted((self.fields or set()) - set(available))
+        unknown += [f"{name}.*" for name in sorted(set(self._nested) - set(nestable))]
+        if unknown:
+            raise ValidationError({FIELDS_PARAM: [f"Unknown field: {name}" for name in unknown]})
+        unknown = sorted(self.expand - set(expandable))
+        if unknown:
+            raise ValidationError({EXPAND_PARAM: [f"Cannot expand: {name}" for name in unknown]})
+        return [name for name in available if self.wants(name)]
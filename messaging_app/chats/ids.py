@@ -0,0 +1,70 @@
+"""
+Time-ordered UUIDs for the chats primary keys.
+
+uuid4 keys are random, so on MySQL/InnoDB (where the table is clustered
+on its primary key) every insert lands on a random page of the index,
+splitting pages and keeping the whole index hot. A version 7 UUID
+(RFC 9562) starts with the Unix time in milliseconds, so new rows append
+at the end of the index like an auto-increment would, while ids stay
+globally unique and unguessable enough to expose in URLs.
+
+Within one process uuid7() is strictly increasing, also for ids made in
+the same millisecond: the 12 bits after the timestamp count up from a
+random start. Ids of existing rows can be rebuilt from their creation
+time with uuid7(when), see the rekey_uuid7 management command.
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+_lock = threading.Lock()
+# last (milliseconds << 12 | counter) handed out by this process
+_last = 0
+
+
+def _next_sequence():
+    global _last
+    with _lock:
+        milliseconds = time.time_ns() // 1_000_000
+        if milliseconds <= _last >> 12:
+            # same millisecond (or the clock went back): count up, a full
+            # counter carries over into the next millisecond
+            _last += 1
+        else:
+            # leave room to count up before carrying over
+            _last = milliseconds << 12 | random.getrandbits(11)
+        return _last
+
+
+def uuid7(when=None):
+    """
+    A version 7 UUID for now, or for the datetime when (then without the
+    per-process ordering of ids sharing a millisecond)
+    """
+    if when is None:
+        sequence = _next_sequence()
+    else:
+        # via whole microseconds: float milliseconds can land just below
+        milliseconds = round(when.timestamp() * 1_000_000) // 1000
+        sequence = milliseconds << 12 | random.getrandbits(12)
+    random_bits = int.from_bytes(os.urandom(8), "big") & (1 << 62) - 1
+    return uuid.UUID(int=(
+        (sequence >> 12) << 80      # unix_ts_ms, 48 bits
+        | 0x7 << 76                 # version
+        | (sequence & 0xFFF) << 64  # counter, 12 bits
+        | 0b10 << 62                # variant
+        | random_bits               # 62 bits
+    ))
+
+
+def uuid7_time(value):
+    """
+    Creation time (UTC, to the millisecond) of a version 7 UUID, None for
+    other versions
+    """
+    if value.version != 7:
+        return None
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=timezone.utc)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chats import summaries
+from chats.models import Conversation
+
+
+class Command(BaseCommand):
+    help = 'Rebuild last_message_at, last_message_preview, message_count and last_sender of conversations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Conversations updated per statement (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Walk conversations in primary-key order, one UPDATE per batch, so a
+        large table is never locked as a whole
+        """
+        batch_size = options['batch_size']
+        ids = Conversation.objects.order_by('pk').values_list('pk', flat=True)
+        updated = 0
+        last_pk = None
+        while True:
+            batch = ids.filter(pk__gt=last_pk) if last_pk is not None else ids
+            batch = list(batch[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                updated += summaries.refresh(batch)
+            last_pk = batch[-1]
+            self.stdout.write(f"  {updated} conversations updated")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} conversation summaries"))
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from chats import fast_serializers
+from chats.models import Conversation, Message, User
+from chats.serializers import MessageSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare messages/sec of MessageSerializer and the fast read path on generated data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages', type=int, default=20000,
+            help='Messages generated for the run (default: 20000)'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Runs per path, the best one is reported (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Generate the data inside a transaction that is rolled back at the
+        end, so the command leaves the database as it found it
+        """
+        try:
+            with transaction.atomic():
+                self.run(options['messages'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, count, repeat):
+        sender = User.objects.create(
+            first_name='bench', last_name='user', email='bench@example.com',
+            password='x', role='guest'
+        )
+        conversation = Conversation.objects.create()
+        now = timezone.now()
+        Message.objects.bulk_create(
+            (Message(conversation=conversation, sender=sender,
+                     message_body=f'message {i}', sent_at=now)
+             for i in range(count)),
+            batch_size=500
+        )
+        queryset = Message.objects.filter(conversation=conversation).order_by('-sent_at', '-message_id')
+
+        def model_serializer():
+            return MessageSerializer(queryset.select_related('sender'), many=True).data
+
+        plan = fast_serializers.message_plan()
+
+        def fast_path():
+            return fast_serializers.render_messages(plan.values(queryset), plan)
+
+        results = {}
+        for name, function in (('ModelSerializer', model_serializer), ('fast path', fast_path)):
+            best = min(self.time(function) for _ in range(repeat))
+            results[name] = count / best
+            self.stdout.write(f"  {name:<16} {results[name]:>12,.0f} messages/sec")
+
+        speedup = results['fast path'] / results['ModelSerializer']
+        self.stdout.write(self.style.SUCCESS(f"Fast path is {speedup:.1f}x faster"))
+
+    @staticmethod
+    def time(function):
+        start = time.perf_counter()
+        function()
+        return time.perf_counter() - start
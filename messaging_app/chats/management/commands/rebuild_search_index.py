@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from chats import search
+
+
+class Command(BaseCommand):
+    help = 'Refill the SQLite full-text index of messages (needed after VACUUM)'
+
+    def handle(self, *args, **options):
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Message search index rebuilt"))
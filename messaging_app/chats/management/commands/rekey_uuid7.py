@@ -0,0 +1,99 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Q, Value, When
+
+from chats.ids import uuid7
+from chats.models import Conversation, Message, User
+
+# models to rekey, with the field their new ids take their time from
+TARGETS = [
+    (User, 'created_at'),
+    (Conversation, 'created_at'),
+    (Message, 'sent_at'),
+]
+
+
+def references(model):
+    """
+    Foreign keys pointing at model, those of many-to-many through tables
+    included
+    """
+    return [
+        field
+        for related in apps.get_models(include_auto_created=True)
+        for field in related._meta.concrete_fields
+        if isinstance(field, models.ForeignKey) and field.remote_field.model is model
+    ]
+
+
+def remap(model, field, new_ids):
+    """
+    Move field of model's rows from the old ids to the new ones, one UPDATE
+    """
+    output_field = field.target_field if field.is_relation else field
+    mapping = Case(
+        *(When(**{field.attname: old, 'then': Value(new, output_field=output_field)})
+          for old, new in new_ids.items()),
+        default=F(field.attname),
+    )
+    return model._base_manager.filter(
+        **{f'{field.attname}__in': list(new_ids)}
+    ).update(**{field.name: mapping})
+
+
+class Command(BaseCommand):
+    help = 'Replace the uuid4 primary keys of existing users, conversations and messages with time-ordered uuid7 ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Rows rekeyed per transaction (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Each row gets a uuid7 built from its creation time, and every
+        foreign key pointing at it is moved along in the same transaction.
+        Rows already on version 7 ids are skipped, so the command can be
+        stopped and run again. Ids change: cached pages and URLs holding
+        the old ones stop resolving.
+        """
+        batch_size = options['batch_size']
+        # MySQL checks foreign keys per statement, the others at commit
+        with connection.constraint_checks_disabled():
+            for model, time_field in TARGETS:
+                rekeyed = self.rekey(model, time_field, batch_size)
+                self.stdout.write(f"  {rekeyed} {model._meta.verbose_name_plural} rekeyed")
+        self.stdout.write(self.style.SUCCESS("Primary keys are time-ordered"))
+
+    def rekey(self, model, time_field, batch_size):
+        """
+        Walk model's rows by (time_field, pk), one batch per transaction
+        """
+        pk_name = model._meta.pk.name
+        rows = model._base_manager.order_by(time_field, pk_name).values_list(pk_name, time_field)
+        pointers = references(model)
+        rekeyed = 0
+        last = None
+        while True:
+            batch = rows
+            if last is not None:
+                # rows of this batch come round again with their new ids
+                # and are skipped as version 7
+                batch = rows.filter(
+                    Q(**{f'{time_field}__gt': last[1]})
+                    | Q(**{time_field: last[1], f'{pk_name}__gt': last[0]})
+                )
+            batch = list(batch[:batch_size])
+            if not batch:
+                return rekeyed
+            last = batch[-1]
+            new_ids = {old: uuid7(created) for old, created in batch if old.version != 7}
+            if not new_ids:
+                continue
+            with transaction.atomic():
+                for field in pointers:
+                    remap(field.model, field, new_ids)
+                remap(model, model._meta.pk, new_ids)
+            rekeyed += len(new_ids)
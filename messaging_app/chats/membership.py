@@ -0,0 +1,121 @@
+"""
+Conversation membership checks.
+
+`user in conversation.participants.all()` loads every participant row to
+answer a yes/no question, and the permissions and views ask it several
+times per request. is_participant answers with one EXISTS query on the
+participants through table (covered by its unique (conversation, user)
+index) and remembers the answer for the rest of the request.
+
+With CHATS_PARTICIPANTS_CACHE_TTL set (seconds), each conversation's set
+of participant ids is also kept in the Django cache for that long, so
+repeated checks across requests cost no query at all. The signals in
+chats.signals drop a conversation's entry whenever its participants
+change.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Conversation
+
+Participant = Conversation.participants.through
+
+CACHE_KEY = "chats:participants:{}"
+
+
+def cache_ttl():
+    """
+    Seconds participant-id sets stay cached, 0 when the cache is off
+    """
+    return getattr(settings, "CHATS_PARTICIPANTS_CACHE_TTL", 0)
+
+
+def _pk(obj):
+    return getattr(obj, "pk", obj)
+
+
+def _request_memo(request):
+    """
+    Per-request answers, kept on the underlying HttpRequest so every DRF
+    Request wrapping it shares them
+    """
+    request = getattr(request, "_request", request)
+    memo = getattr(request, "_chats_membership", None)
+    if memo is None:
+        memo = request._chats_membership = {}
+    return memo
+
+
+def participant_ids(conversation):
+    """
+    Set of the conversation's participant ids, cached when enabled
+    """
+    conversation_id = _pk(conversation)
+    ttl = cache_ttl()
+    key = CACHE_KEY.format(conversation_id)
+    if ttl:
+        ids = cache.get(key)
+        if ids is not None:
+            return ids
+    ids = frozenset(
+        Participant.objects.filter(conversation_id=conversation_id)
+        .values_list("user_id", flat=True)
+    )
+    if ttl:
+        cache.set(key, ids, ttl)
+    return ids
+
+
+def is_participant(user, conversation, request=None):
+    """
+    Whether user takes part in conversation (an instance or a pk).
+    Pass the request to reuse the answer for the rest of it.
+    """
+    user_id = _pk(user)
+    if user_id is None:
+        # anonymous users have no pk
+        return False
+    conversation_id = _pk(conversation)
+    memo = _request_memo(request) if request is not None else None
+    if memo is not None and (conversation_id, user_id) in memo:
+        return memo[conversation_id, user_id]
+
+    if cache_ttl():
+        answer = user_id in participant_ids(conversation_id)
+    else:
+        answer = Participant.objects.filter(
+            conversation_id=conversation_id, user_id=user_id
+        ).exists()
+
+    if memo is not None:
+        memo[conversation_id, user_id] = answer
+    return answer
+
+
+def conversations_of(user):
+    """
+    Subquery of the ids of the conversations user takes part in, read from
+    the (user, conversation) index alone without joining conversations
+    """
+    return Participant.objects.filter(user_id=_pk(user)).values("conversation_id")
+
+
+def member_conversation_ids(user, conversation_ids):
+    """
+    Which of conversation_ids user takes part in, in a single query
+    """
+    user_id = _pk(user)
+    if user_id is None or not conversation_ids:
+        return set()
+    return set(
+        Participant.objects.filter(
+            user_id=user_id, conversation_id__in=conversation_ids
+        ).values_list("conversation_id", flat=True)
+    )
+
+
+def invalidate(*conversation_ids):
+    """
+    Forget the cached participant ids of the given conversations
+    """
+    cache.delete_many([CACHE_KEY.format(pk) for pk in conversation_ids])
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sent_at', 'message_id'], name='chats_messa_sent_at_0a044e_idx'),
+        ),
+    ]
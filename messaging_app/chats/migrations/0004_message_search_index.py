@@ -0,0 +1,62 @@
+from django.db import migrations
+
+FTS_TABLE = "chats_message_fts"
+
+SQLITE_FORWARD = [
+    # external-content FTS5 table: the text lives in chats_message only
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    "message_body, content='chats_message', content_rowid='rowid')",
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON chats_message BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, message_body) VALUES (new.rowid, new.message_body); "
+    "END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON chats_message BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_body) "
+    "VALUES ('delete', old.rowid, old.message_body); "
+    "END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF message_body ON chats_message BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_body) "
+    "VALUES ('delete', old.rowid, old.message_body); "
+    f"INSERT INTO {FTS_TABLE}(rowid, message_body) VALUES (new.rowid, new.message_body); "
+    "END",
+    # index the messages that already exist
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+MYSQL_FORWARD = [
+    "CREATE FULLTEXT INDEX chats_message_body_ft ON chats_message (message_body)",
+]
+
+MYSQL_BACKWARD = [
+    "DROP INDEX chats_message_body_ft ON chats_message",
+]
+
+
+def run(statements):
+    """
+    Run the statements of the migrating database's vendor, if it has any
+    """
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement, params=None)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0003_conversation_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARD, "mysql": MYSQL_FORWARD}),
+            run({"sqlite": SQLITE_BACKWARD, "mysql": MYSQL_BACKWARD}),
+        ),
+    ]
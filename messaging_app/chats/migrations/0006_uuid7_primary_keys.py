@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:51
+
+import chats.ids
+from chats.search import restore_triggers
+from django.db import migrations, models
+
+
+# SQLite applies AlterField by copying chats_message into a new table,
+# which drops its full-text triggers; restore_triggers recreates them
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0005_conversation_version'),
+    ]
+
+    operations = [
+        # first, so that it also runs last when unapplying
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        migrations.AlterField(
+            model_name='conversation',
+            name='conversation_id',
+            field=models.UUIDField(default=chats.ids.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='message_id',
+            field=models.UUIDField(default=chats.ids.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='user_id',
+            field=models.UUIDField(default=chats.ids.uuid7, editable=False, primary_key=True, serialize=False, unique=True),
+        ),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
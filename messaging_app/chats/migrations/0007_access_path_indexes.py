@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:54
+
+from chats.search import restore_triggers
+from django.db import migrations, models
+import django.db.models.deletion
+
+# AlterField on chats_message makes SQLite rebuild it again, see 0006
+
+PARTICIPANT_USER_INDEX = models.Index(
+    fields=['user', 'conversation'], name='chats_partic_user_conv_idx'
+)
+
+
+def participants_model(apps):
+    Conversation = apps.get_model('chats', 'Conversation')
+    return Conversation._meta.get_field('participants').remote_field.through
+
+
+def add_participant_index(apps, schema_editor):
+    """
+    The auto-created through table only has the (conversation, user)
+    unique index plus one index per column; a user's conversations are
+    read through (user, conversation) without touching the table
+    """
+    schema_editor.add_index(participants_model(apps), PARTICIPANT_USER_INDEX)
+
+
+def remove_participant_index(apps, schema_editor):
+    schema_editor.remove_index(participants_model(apps), PARTICIPANT_USER_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0006_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_triggers),
+        # before dropping the single column index, MySQL keeps one for the foreign key
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-sent_at', '-message_id'], name='chats_messa_convers_6c2603_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'message_id'], name='chats_messa_convers_f80510_idx'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chats.conversation'),
+        ),
+        migrations.RunPython(add_participant_index, remove_participant_index),
+        migrations.RunPython(restore_triggers, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,12 @@
-import uuid
 from django.db import models
+from django.utils import timezone
+
+from .ids import uuid7
 
 
 class User(models.Model):
     user_id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, unique=True
+        primary_key=True, default=uuid7, editable=False, unique=True
     )
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -32,7 +34,7 @@ class User(models.Model):
 
 class Conversation(models.Model):
     conversation_id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, unique=True
+        primary_key=True, default=uuid7, editable=False, unique=True
     )
     participants = models.ManyToManyField(
         User,
@@ -40,13 +42,35 @@ class Conversation(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Summary of the latest activity, kept up to date by chats.summaries
+    last_message_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_message_preview = models.CharField(max_length=100, blank=True, default="", editable=False)
+    message_count = models.PositiveIntegerField(default=0, editable=False)
+    last_sender = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+"
+    )
+    # Bumped on every change visible through the API, for conditional GETs
+    version = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            # inbox: a user's conversations by most recent activity
+            models.Index(fields=["-last_message_at"]),
+        ]
+
     def __str__(self):
         return f"Conversation {self.conversation_id}"
 
 
 class Message(models.Model):
     message_id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, unique=True
+        primary_key=True, default=uuid7, editable=False, unique=True
     )
     sender = models.ForeignKey(
         User,
@@ -56,10 +80,25 @@ class Message(models.Model):
     conversation = models.ForeignKey(
         Conversation,
         on_delete=models.CASCADE,
-        related_name="messages"
+        related_name="messages",
+        # the composite indexes below start with it
+        db_index=False
     )
     message_body = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination walks messages by (sent_at, message_id)
+            models.Index(fields=["sent_at", "message_id"]),
+            # a conversation's history newest first, its latest message;
+            # descending so that the per-conversation window of the
+            # recent messages needs no sort either (named as 0007 created it)
+            models.Index(fields=["conversation", "-sent_at", "-message_id"],
+                         name="chats_messa_convers_6c2603_idx"),
+            # a conversation's history by time-ordered id
+            models.Index(fields=["conversation", "message_id"]),
+        ]
+
     def __str__(self):
         return f"Message {self.message_id}"
@@ -1,5 +1,17 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+import uuid
+from base64 import b64decode, b64encode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination, PageNumberPagination, _positive_int
+)
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .search import search_after
 
 class MessagePagination(PageNumberPagination):
     """
@@ -21,4 +33,226 @@ class MessagePagination(PageNumberPagination):
             'previous': self.get_previous_link(),
             'page_size': self.page_size,
             'results': data
-        })
\ No newline at end of file
+        })
+
+class MessageCursorPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for messages, newest first.
+
+    Pages are cut on the (sent_at, message_id) pair of the last row seen
+    instead of an OFFSET, and no COUNT(*) is run, so page 10,000 costs the
+    same as page 1 and rows arriving between requests never shift a page.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-sent_at', '-message_id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor['reverse']
+        if reverse:
+            # walking back towards newer messages: flip the order, then
+            # flip the page so it still reads newest first
+            queryset = queryset.order_by(*(field.lstrip('-') for field in self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(self.cursor))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        self.page = rows
+        return rows
+
+    @staticmethod
+    def keyset_filter(cursor):
+        """
+        Rows strictly after the cursor position in the walking direction
+        """
+        sent_at, message_id = cursor['sent_at'], cursor['message_id']
+        if cursor['reverse']:
+            return Q(sent_at__gt=sent_at) | Q(
+                sent_at=sent_at, message_id__gt=message_id)
+        return Q(sent_at__lt=sent_at) | Q(
+            sent_at=sent_at, message_id__lt=message_id)
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        """
+        Position encoded in the cursor query parameter, or None
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')))
+            sent_at = parse_datetime(data['t'])
+            if sent_at is None:
+                raise ValueError(data['t'])
+            return {
+                'sent_at': sent_at,
+                'message_id': uuid.UUID(data['id']),
+                'reverse': bool(data.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, message, reverse):
+        data = {'t': message.sent_at.isoformat(), 'id': str(message.message_id)}
+        if reverse:
+            data['r'] = 1
+        encoded = b64encode(json.dumps(data).encode('ascii')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # walked back past the newest row: restart from the top
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        """
+        Same envelope as MessagePagination, minus the counts
+        """
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'page_size': self.page_size,
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'page_size': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+
+class MessageSearchPagination(MessageCursorPagination):
+    """
+    Keyset pagination over ranked full-text search results.
+
+    Results come ordered by (search_rank, message_id) descending from
+    chats.search; the cursor holds the last pair seen and the next page
+    continues strictly after it. Forward only: search results have no
+    stable "newer" side to walk back to.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.text = request.query_params.get('search', '').strip()
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is not None:
+            queryset = search_after(
+                queryset, self.text, self.cursor['rank'], self.cursor['message_id']
+            )
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.has_previous = False
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')))
+            return {'rank': float(data['s']), 'message_id': uuid.UUID(data['id'])}
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, message, reverse):
+        data = {'s': message.search_rank, 'id': str(message.message_id)}
+        encoded = b64encode(json.dumps(data).encode('ascii')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+
+class MessageIdCursorPagination(MessageCursorPagination):
+    """
+    Keyset pagination on the primary key alone, newest first.
+
+    Message ids are time-ordered (chats.ids.uuid7) and sent_at is set on
+    creation, so walking message_id downwards walks the history newest
+    first. The cursor is a single id and the primary key, or any index
+    ending in it such as InnoDB's (conversation_id) secondary index, serves
+    the order. Rows still on uuid4 ids need the rekey_uuid7 command first.
+    """
+    ordering = ('-message_id',)
+
+    @staticmethod
+    def keyset_filter(cursor):
+        if cursor['reverse']:
+            return Q(message_id__gt=cursor['message_id'])
+        return Q(message_id__lt=cursor['message_id'])
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')))
+            return {'message_id': uuid.UUID(data['id']), 'reverse': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, message, reverse):
+        data = {'id': str(message.message_id)}
+        if reverse:
+            data['r'] = 1
+        encoded = b64encode(json.dumps(data).encode('ascii')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+
+def message_paginator(request):
+    """
+    Keyset pagination on the primary key with ?pagination=id, on
+    (sent_at, message_id) with ?pagination=cursor (or once a cursor is
+    followed), page numbers otherwise
+    """
+    params = request.query_params
+    if params.get('pagination') == 'id':
+        return MessageIdCursorPagination()
+    if MessageCursorPagination.cursor_query_param in params \
+            or params.get('pagination') == 'cursor':
+        return MessageCursorPagination()
+    return MessagePagination()
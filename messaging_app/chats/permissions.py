@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .membership import is_participant
+
 class IsOwnerOrReadOnly(permissions.BasePermission):
     """
     Custom permission to only allow owners of an object to edit it.
@@ -17,7 +19,7 @@ class IsParticipant(permissions.BasePermission):
     Custom permission to only allow participants of a conversation to access it.
     """
     def has_object_permission(self, request, view, obj):
-        return request.user in obj.participants.all()
+        return is_participant(request.user, obj, request)
 
 
 class IsConversationParticipant(permissions.BasePermission):
@@ -25,7 +27,7 @@ class IsConversationParticipant(permissions.BasePermission):
     Custom permission to only allow conversation participants to access messages.
     """
     def has_object_permission(self, request, view, obj):
-        return request.user in obj.conversation.participants.all()
+        return is_participant(request.user, obj.conversation_id, request)
 
 class IsParticipantOfConversation(permissions.BasePermission):
     """
@@ -47,11 +49,11 @@ class IsParticipantOfConversation(permissions.BasePermission):
         """
         # For Conversation objects
         if hasattr(obj, 'participants'):
-            return request.user in obj.participants.all()
+            return is_participant(request.user, obj, request)
         
         # For Message objects
         elif hasattr(obj, 'conversation'):
-            return request.user in obj.conversation.participants.all()
+            return is_participant(request.user, obj.conversation_id, request)
         
         # For other objects, default to safe methods only
         return request.method in permissions.SAFE_METHODS
@@ -80,53 +82,7 @@ class IsConversationOwner(permissions.BasePermission):
             return True
         
         # For other operations, allow if user is participant
-        return request.user in obj.participants.all()
-
-
-# Update Permissions with Explicit Method Handling (PUT PATCH DELETE)
-class IsParticipantOfConversation(permissions.BasePermission):
-    """
-    Custom permission to only allow participants of a conversation to access it.
-    - Allow only authenticated users to access the API
-    - Allow only participants in a conversation to send, view, update and delete messages
-    """
-    
-    def has_permission(self, request, view):
-        """
-        Check if the user is authenticated for any API access
-        """
-        # Allow only authenticated users to access the API
-        return request.user and request.user.is_authenticated
-    
-    def has_object_permission(self, request, view, obj):
-        """
-        Check if the user is a participant of the conversation for object-level access
-        Specifically handle PUT, PATCH, DELETE methods
-        """
-        # Check if user is participant for conversation objects
-        if hasattr(obj, 'participants'):
-            is_participant = request.user in obj.participants.all()
-            
-            # For PUT, PATCH, DELETE - require participant status
-            if request.method in ['PUT', 'PATCH', 'DELETE']:
-                return is_participant
-            
-            # For GET, POST, etc. - allow if participant
-            return is_participant
-        
-        # Check if user is participant for message objects
-        elif hasattr(obj, 'conversation'):
-            is_participant = request.user in obj.conversation.participants.all()
-            
-            # For PUT, PATCH, DELETE - require participant status
-            if request.method in ['PUT', 'PATCH', 'DELETE']:
-                return is_participant
-            
-            # For GET, POST, etc. - allow if participant
-            return is_participant
-        
-        # Default deny for other objects
-        return False
+        return is_participant(request.user, obj, request)
 
 
 class IsMessageOwner(permissions.BasePermission):
@@ -143,7 +99,7 @@ class IsMessageOwner(permissions.BasePermission):
             return obj.sender == request.user
         
         # For POST, check if user is participant in conversation
-        return request.user in obj.conversation.participants.all()
+        return is_participant(request.user, obj.conversation_id, request)
 
 
 class IsConversationOwner(permissions.BasePermission):
@@ -157,12 +113,10 @@ class IsConversationOwner(permissions.BasePermission):
         
         # For PUT, PATCH, DELETE - require participant status
         if request.method in ['PUT', 'PATCH', 'DELETE']:
-            return request.user in obj.participants.all()
+            return is_participant(request.user, obj, request)
         
         # For GET - allow if participant
-        return request.user in obj.participants.all()
-
-from rest_framework import permissions
+        return is_participant(request.user, obj, request)
 
 class IsParticipantOfConversation(permissions.BasePermission):
     """
@@ -182,26 +136,26 @@ class IsParticipantOfConversation(permissions.BasePermission):
         """
         # Handle PUT method
         if request.method == 'PUT':
-            return self._check_participant_access(request.user, obj)
+            return self._check_participant_access(request, obj)
         
         # Handle PATCH method  
         elif request.method == 'PATCH':
-            return self._check_participant_access(request.user, obj)
+            return self._check_participant_access(request, obj)
         
         # Handle DELETE method
         elif request.method == 'DELETE':
-            return self._check_participant_access(request.user, obj)
+            return self._check_participant_access(request, obj)
         
         # Handle other methods (GET, POST, etc.)
         else:
-            return self._check_participant_access(request.user, obj)
+            return self._check_participant_access(request, obj)
     
-    def _check_participant_access(self, user, obj):
+    def _check_participant_access(self, request, obj):
         """
         Helper method to check if user is participant in conversation
         """
         if hasattr(obj, 'participants'):
-            return user in obj.participants.all()
+            return is_participant(request.user, obj, request)
         elif hasattr(obj, 'conversation'):
-            return user in obj.conversation.participants.all()
+            return is_participant(request.user, obj.conversation_id, request)
         return False
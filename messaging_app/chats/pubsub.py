@@ -0,0 +1,149 @@
+"""
+Publish/subscribe of chat events for the push endpoint (chats.push).
+
+Publishers are ordinary sync code (signals, on_commit hooks) and never
+wait on subscribers. Each subscriber is an async consumer with a bounded
+queue. A consumer that falls queue_size events behind is cut off
+(SlowConsumer) instead of slowing publishers down or buffering without
+limit. Its client reconnects and catches up from the database.
+
+The backend is pluggable through CHATS_PUBSUB_BACKEND, a dotted path to
+a class with the InProcessBackend interface: subscribe(channel,
+queue_size), unsubscribe(subscription), publish(channel, event) and
+has_subscribers(channel). The default InProcessBackend only reaches
+consumers in the same process, which is enough for a single box and for
+tests. Deployments running several processes need a backend on a shared
+broker.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class SlowConsumer(Exception):
+    """
+    The subscriber did not keep up and was cut off
+    """
+
+
+class Subscription:
+    """
+    One consumer's queue of events on a channel, read from its event loop
+    """
+
+    def __init__(self, backend, channel, queue_size, loop):
+        self.backend = backend
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+        self.closed = False
+
+    def deliver(self, event):
+        """
+        Queue event, in the subscriber's loop; a full queue cuts it off
+        """
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.close()
+            # wake a get() waiting on the now useless backlog
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self, timeout=None):
+        """
+        Next event, None when timeout seconds pass without one
+        """
+        if self.overflowed:
+            raise SlowConsumer(self.channel)
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if self.overflowed:
+            raise SlowConsumer(self.channel)
+        return event
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.backend.unsubscribe(self)
+
+
+class InProcessBackend:
+    """
+    Subscribers of this process, by channel
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel, queue_size):
+        subscription = Subscription(self, channel, queue_size, asyncio.get_running_loop())
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def has_subscribers(self, channel):
+        return channel in self._channels
+
+    def publish(self, channel, event):
+        """
+        Hand event to every subscriber's loop, from any thread
+        """
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # its event loop is gone
+                subscription.close()
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    The configured backend, created on first use
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "CHATS_PUBSUB_BACKEND", "chats.pubsub.InProcessBackend")
+        _backend = import_string(path)()
+    return _backend
+
+
+def queue_size():
+    """
+    Events a subscriber may fall behind before it is cut off
+    """
+    return getattr(settings, "CHATS_PUSH_QUEUE_SIZE", 100)
+
+
+def subscribe(channel):
+    return get_backend().subscribe(channel, queue_size())
+
+
+def publish(channel, event):
+    get_backend().publish(channel, event)
+
+
+def has_subscribers(channel):
+    return get_backend().has_subscribers(channel)
@@ -0,0 +1,202 @@
+"""
+Server-Sent Events push of new messages, one stream per conversation.
+
+GET /api/conversations/{id}/events/ keeps the response open under ASGI
+and writes every message created in the conversation as it commits:
+
+    id: <message_id>
+    event: message
+    data: <the message as MessageSerializer renders it>
+
+Clients read it with EventSource (session cookie) or any HTTP client
+sending the usual Bearer token. When they reconnect they send the last
+id they saw as Last-Event-ID, and the messages after it are replayed
+from the database first, "after" in the (sent_at, message_id) order the
+history endpoint pages by, an index range. When the client has missed too much for a
+replay, or falls behind the live stream (see chats.pubsub), it gets an
+`overflow` event and should catch up through the REST endpoints.
+
+Comments are sent as heartbeats every CHATS_PUSH_HEARTBEAT seconds.
+Streams end after CHATS_PUSH_MAX_SECONDS so that streams of clients that
+went away are not kept forever, and clients then reconnect on their own.
+A participant removed from the conversation has their stream closed.
+"""
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import pubsub
+from .auth import CustomJWTAuthentication, CustomSessionAuthentication
+from .membership import is_participant
+from .models import Message
+from .serializers import MessageSerializer
+
+
+def channel(conversation_id):
+    return f"conversation:{conversation_id}"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def message_event(message):
+    """
+    Event of a message, serialized once for every subscriber
+    """
+    return {
+        "id": str(message.message_id),
+        "event": "message",
+        "data": json.dumps(MessageSerializer(message).data, cls=JSONEncoder),
+    }
+
+
+def publish_messages(messages):
+    """
+    Push messages once the transaction creating them commits; nothing is
+    serialized for conversations nobody listens to
+    """
+    def push():
+        for message in messages:
+            name = channel(message.conversation_id)
+            if pubsub.has_subscribers(name):
+                pubsub.publish(name, message_event(message))
+    transaction.on_commit(push)
+
+
+def publish_participants_changed(conversation_ids):
+    """
+    Make the open streams of these conversations check their user is
+    still a participant
+    """
+    def push():
+        for conversation_id in conversation_ids:
+            pubsub.publish(channel(conversation_id), {"event": "participants"})
+    transaction.on_commit(push)
+
+
+def format_event(event):
+    lines = []
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {event.get('data', '{}')}")
+    return "\n".join(lines) + "\n\n"
+
+
+def missed_events(conversation_id, last_event_id, limit):
+    """
+    Events of the messages after the one last_event_id names, at most
+    limit of them; None when there are more or that message is gone (the
+    client must catch up otherwise)
+    """
+    last = (
+        Message.objects.filter(conversation_id=conversation_id, pk=last_event_id)
+        .values_list("sent_at", "message_id")[:1]
+    )
+    if not last:
+        return None
+    sent_at, message_id = last[0]
+    messages = list(
+        Message.objects.filter(conversation_id=conversation_id)
+        .filter(Q(sent_at__gt=sent_at) | Q(sent_at=sent_at, message_id__gt=message_id))
+        .select_related("sender")
+        .order_by("sent_at", "message_id")[:limit + 1]
+    )
+    if len(messages) > limit:
+        return None
+    return [message_event(message) for message in messages]
+
+
+def authenticate(request):
+    """
+    The user of a Bearer token or of the session, else None
+    """
+    drf_request = Request(
+        request, authenticators=[CustomJWTAuthentication(), CustomSessionAuthentication()]
+    )
+    user = drf_request.user
+    # chats.User has no is_authenticated, AnonymousUser's is False
+    return user if user and getattr(user, "is_authenticated", True) else None
+
+
+async def conversation_events(request, conversation_id):
+    """
+    The conversation's event stream, for its participants
+    """
+    try:
+        user = await sync_to_async(authenticate)(request)
+    except AuthenticationFailed:
+        user = None
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    return await open_stream(user, conversation_id, request.headers.get("Last-Event-ID"))
+
+
+async def open_stream(user, conversation_id, last_event_id=None):
+    """
+    Streaming response of the conversation's events for user; subscribes
+    before replaying, so nothing committed in between is lost
+    """
+    if not await sync_to_async(is_participant)(user, conversation_id):
+        return JsonResponse(
+            {"detail": "You do not have permission to perform this action."}, status=403
+        )
+    try:
+        last_event_id = uuid.UUID(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    subscription = pubsub.subscribe(channel(conversation_id))
+    response = StreamingHttpResponse(
+        stream(subscription, user, conversation_id, last_event_id),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # let nginx pass the events through as they come
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def stream(subscription, user, conversation_id, last_event_id):
+    loop = subscription.loop
+    deadline = loop.time() + _setting("CHATS_PUSH_MAX_SECONDS", 300)
+    heartbeat = _setting("CHATS_PUSH_HEARTBEAT", 15)
+    try:
+        yield f"retry: {_setting('CHATS_PUSH_RETRY_MS', 3000)}\n\n"
+        replayed = set()
+        if last_event_id is not None:
+            missed = await sync_to_async(missed_events)(
+                conversation_id, last_event_id, _setting("CHATS_PUSH_REPLAY_LIMIT", 100)
+            )
+            if missed is None:
+                yield format_event({"event": "overflow"})
+                return
+            for event in missed:
+                yield format_event(event)
+            replayed.update(event["id"] for event in missed)
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            event = await subscription.get(timeout=min(heartbeat, remaining))
+            if event is None:
+                yield ": keepalive\n\n"
+            elif event["event"] == "participants":
+                if not await sync_to_async(is_participant)(user, conversation_id):
+                    return
+            elif event["id"] not in replayed:
+                # committed after subscribing and before the replay read:
+                # sent already
+                yield format_event(event)
+    except pubsub.SlowConsumer:
+        yield format_event({"event": "overflow"})
+    finally:
+        subscription.close()
@@ -0,0 +1,152 @@
+"""
+Full-text message search.
+
+SearchFilter's icontains turns into LIKE '%term%' and scans every message
+a user can see. Here the search goes through a real full-text index
+instead, created by migration 0004:
+
+* SQLite: an FTS5 table (chats_message_fts) over message_body, kept in
+  sync with chats_message by triggers on insert, update and delete.
+* MySQL: a FULLTEXT index on chats_message.message_body, maintained by
+  InnoDB itself.
+
+Other databases fall back to icontains, every result ranking 0. Results
+carry a search_rank annotation (higher is better) and are ordered by
+(search_rank, message_id) descending, which MessageSearchPagination
+pages through with a keyset cursor.
+"""
+from django.db import connection
+from django.db.models import Value
+from django.db.models.fields import FloatField
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Message
+
+FTS_TABLE = "chats_message_fts"
+MESSAGE_TABLE = Message._meta.db_table
+
+# The SQLite triggers of migration 0004. Migrations that alter a field of
+# chats_message make SQLite copy it into a new table, which drops them and
+# changes the rowids the index points at: those call restore_triggers.
+SQLITE_TRIGGERS = [
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON chats_message BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, message_body) VALUES (new.rowid, new.message_body); "
+    "END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON chats_message BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_body) "
+    "VALUES ('delete', old.rowid, old.message_body); "
+    "END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF message_body ON chats_message BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_body) "
+    "VALUES ('delete', old.rowid, old.message_body); "
+    f"INSERT INTO {FTS_TABLE}(rowid, message_body) VALUES (new.rowid, new.message_body); "
+    "END",
+]
+
+
+def restore_triggers(apps, schema_editor):
+    """
+    RunPython operation recreating the SQLite full-text triggers and
+    reindexing every message; other databases need nothing
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in [
+        *(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}" for suffix in ("ai", "ad", "au")),
+        *SQLITE_TRIGGERS,
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]:
+        schema_editor.execute(statement, params=None)
+
+
+def fts5_query(text):
+    """
+    The words of text as quoted FTS5 strings, so user input can never be
+    read as query syntax; all of them must match
+    """
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+def _ranked_sql(vendor):
+    """
+    (tables, match condition, rank expression) for vendor, or None
+    """
+    if vendor == "sqlite":
+        return (
+            [FTS_TABLE],
+            f"{FTS_TABLE}.rowid = {MESSAGE_TABLE}.rowid AND {FTS_TABLE} MATCH %s",
+            # bm25() is lower for better matches, flip it
+            f"-bm25({FTS_TABLE})",
+        )
+    if vendor == "mysql":
+        match = f"MATCH ({MESSAGE_TABLE}.message_body) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        return [], match, match
+    return None
+
+
+def search(queryset, text):
+    """
+    Messages of queryset matching text, best first, with search_rank
+    """
+    vendor = connection.vendor
+    sql = _ranked_sql(vendor)
+    if sql is None:
+        return (
+            queryset.filter(message_body__icontains=text)
+            .annotate(search_rank=Value(0.0, output_field=FloatField()))
+            .order_by("-message_id")
+        )
+    tables, match, rank = sql
+    term = fts5_query(text) if vendor == "sqlite" else text
+    return queryset.extra(
+        tables=tables,
+        where=[match],
+        params=[term],
+        select={"search_rank": rank},
+        select_params=[term] if "%s" in rank else [],
+    ).order_by("-search_rank", "-message_id")
+
+
+def search_after(queryset, text, rank, message_id):
+    """
+    Narrow a search() queryset to the results ranked after (rank, message_id)
+    """
+    sql = _ranked_sql(connection.vendor)
+    if sql is None:
+        # every fallback result ranks the same
+        return queryset.filter(message_id__lt=message_id)
+    _, _, expression = sql
+    term = fts5_query(text) if connection.vendor == "sqlite" else text
+    params = [term] if "%s" in expression else []
+    return queryset.extra(
+        where=[
+            f"({expression} < %s OR ({expression} = %s AND {MESSAGE_TABLE}.message_id < %s))"
+        ],
+        params=params + [rank] + params + [rank, message_id.hex],
+    )
+
+
+def rebuild_index():
+    """
+    Refill the SQLite FTS table from chats_message. Needed after a VACUUM,
+    which may renumber the rowids the index points at
+    """
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    ?search= over message bodies through the full-text index, ranked
+    """
+    search_param = "search"
+
+    def get_search_text(self, request):
+        return request.query_params.get(self.search_param, "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        text = self.get_search_text(request)
+        if not text:
+            return queryset
+        return search(queryset, text)
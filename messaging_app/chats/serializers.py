@@ -1,4 +1,8 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
+from . import fast_serializers
+from .fieldsets import Fieldset
+from .membership import is_participant
 from .models import User, Conversation, Message
 
 
@@ -66,30 +70,139 @@ class ConversationSerializer(serializers.ModelSerializer):
 
 # editions: Updated Serializers for Better Validation
 
-class MessageSerializer(serializers.ModelSerializer):
+class UserSummarySerializer(serializers.ModelSerializer):
+    """
+    A related user expanded in place of its name, see ?expand=
+    """
+    class Meta:
+        model = User
+        fields = ['user_id', 'first_name', 'last_name']
+
+
+class SparseFieldsMixin:
+    """
+    Keep only the fields picked by the 'fieldset' in the context (the
+    request's ?fields= and ?expand=, see chats.fieldsets). expandable_fields
+    builds the field that replaces an expanded one; nested_fields may take
+    their own dotted fields.
+    """
+    expandable_fields = {}
+    nested_fields = ()
+
+    def field_path(self):
+        """
+        Names of the nested fields leading to this serializer
+        """
+        names = []
+        node = self
+        while node is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return reversed(names)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        if fieldset is None:
+            return fields
+        for name in self.field_path():
+            fieldset = fieldset.nested(name)
+        if fieldset.is_full:
+            return fields
+        keep = fieldset.select(
+            list(fields), self.expandable_fields, self.nested_fields
+        )
+        for name in fieldset.expand & set(keep):
+            fields[name] = self.expandable_fields[name]()
+        return {name: fields[name] for name in keep}
+
+
+class MessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     sender = serializers.StringRelatedField(read_only=True)
     conversation = serializers.PrimaryKeyRelatedField(queryset=Conversation.objects.all())
     
     class Meta:
         model = Message
-        fields = ['id', 'conversation', 'sender', 'content', 'timestamp', 'read']
-        read_only_fields = ['sender', 'timestamp']
+        fields = ['message_id', 'conversation', 'sender', 'message_body',
+                  'sent_at']
+        read_only_fields = ['sender', 'sent_at']
     
+    expandable_fields = {
+        'sender': lambda: UserSummarySerializer(read_only=True),
+    }
+
     def validate_conversation(self, value):
         """
         Validate that the current user is a participant in the conversation
         """
-        user = self.context['request'].user
-        if user not in value.participants.all():
+        request = self.context['request']
+        if not is_participant(request.user, value, request):
             raise serializers.ValidationError("You are not a participant in this conversation")
         return value
 
-class ConversationSerializer(serializers.ModelSerializer):
+
+class ConversationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     participants = serializers.StringRelatedField(many=True, read_only=True)
     messages = MessageSerializer(many=True, read_only=True)
     
     class Meta:
         model = Conversation
-        fields = ['id', 'participants', 'messages', 'created_at', 'updated_at']
-        read_only_fields = ['created_at', 'updated_at']
+        fields = ['conversation_id', 'participants', 'messages', 'created_at',
+                  'last_message_at', 'last_message_preview', 'message_count',
+                  'last_sender']
+        read_only_fields = ['created_at', 'last_message_at',
+                            'last_message_preview', 'message_count',
+                            'last_sender']
+
+    expandable_fields = {
+        'participants':
+            lambda: UserSummarySerializer(many=True, read_only=True),
+        'last_sender': lambda: UserSummarySerializer(read_only=True),
+    }
+    nested_fields = ('messages',)
+
 
+class MessageBulkItemSerializer(serializers.Serializer):
+    """
+    One message of a bulk send. The conversation is a bare id so that
+    membership can be checked for all items at once, not per item.
+    """
+    conversation = serializers.UUIDField()
+    message_body = serializers.CharField()
+
+
+class ConversationListSerializer(ConversationSerializer):
+    """
+    Conversation with only its most recent messages embedded, newest first.
+    The full history is paginated by the conversation's messages action.
+    """
+    messages = MessageSerializer(source='recent_messages', many=True,
+                                 read_only=True)
+
+    @staticmethod
+    def prefetch(queryset, limit, fieldset=None):
+        """
+        Participants, by name, plus the last `limit` messages of every
+        conversation, in one query each: the sliced prefetch is ranked with
+        ROW_NUMBER() per conversation instead of loading whole histories.
+        With a fieldset, the prefetches it leaves out are skipped and the
+        messages read only the columns it asks for.
+        """
+        fieldset = fieldset or Fieldset()
+        lookups = []
+        if fieldset.wants('participants'):
+            participants = User.objects.order_by(
+                'first_name', 'last_name', 'user_id'
+            )
+            lookups.append(Prefetch('participants', queryset=participants))
+        if fieldset.wants('messages'):
+            plan = fast_serializers.message_plan(fieldset.nested('messages'))
+            recent = (
+                plan.only(Message.objects.all(), 'conversation')
+                .order_by('-sent_at', '-message_id')[:limit]
+            )
+            lookups.append(Prefetch(
+                'messages', queryset=recent, to_attr='recent_messages'
+            ))
+        return queryset.prefetch_related(*lookups)
@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import membership, push, summaries
+from .auth import invalidate_user
+from .models import Conversation, Message, User
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def invalidate_participants_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop cached participant ids when participants are added or removed,
+    from either side of the relation, and mark the conversations changed
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        # conversation.participants.add/remove/clear
+        conversation_ids = [instance.pk]
+    elif action == "pre_clear":
+        # user.conversations.clear(): every conversation of the user
+        conversation_ids = list(instance.conversations.values_list("pk", flat=True))
+    else:
+        # user.conversations.add/remove
+        conversation_ids = list(pk_set)
+    membership.invalidate(*conversation_ids)
+    summaries.touch(conversation_ids)
+    if action != "post_add":
+        # open event streams of removed participants get closed
+        push.publish_participants_changed(conversation_ids)
+
+
+@receiver(post_delete, sender=Conversation)
+def invalidate_participants_on_delete(sender, instance, **kwargs):
+    """
+    A deleted conversation has no participants left to cache
+    """
+    membership.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Message)
+def update_summary_on_create(sender, instance, created, raw=False, **kwargs):
+    """
+    Keep the conversation's latest-activity summary current and push new
+    messages to its event streams; an edited message only changes the
+    conversation's version
+    """
+    if raw:
+        return
+    if created:
+        summaries.message_created(instance)
+        push.publish_messages([instance])
+    else:
+        summaries.touch([instance.conversation_id])
+
+
+@receiver(post_delete, sender=Message)
+def update_summary_on_delete(sender, instance, **kwargs):
+    """
+    Recompute the summary once a message is gone
+    """
+    summaries.message_deleted(instance)
+
+
+@receiver(pre_save, sender=User)
+def detect_rename(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Note whether a saved user's displayed name changes, for mark_renamed
+    """
+    instance._chats_renamed = False
+    if raw or instance._state.adding:
+        return
+    fields = summaries.DISPLAYED_USER_FIELDS
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return
+    old = User.objects.filter(pk=instance.pk).values_list(*fields).first()
+    instance._chats_renamed = (
+        old is not None and old != tuple(getattr(instance, name) for name in fields)
+    )
+
+
+@receiver(post_save, sender=User)
+def mark_renamed(sender, instance, created, **kwargs):
+    """
+    Conversation and message bodies show participants' and senders'
+    names: a rename changes the validators of every conversation showing it
+    """
+    if getattr(instance, "_chats_renamed", False):
+        instance._chats_renamed = False
+        summaries.user_renamed(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, raw=False, **kwargs):
+    """
+    Authentication must not keep using a user that was deactivated, got a
+    new password or is gone; any save counts, it is rare next to reads
+    """
+    if not raw:
+        invalidate_user(instance.pk)
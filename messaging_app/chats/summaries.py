@@ -0,0 +1,102 @@
+"""
+Denormalized conversation summaries.
+
+Conversation.last_message_at, last_message_preview, message_count and
+last_sender let the inbox be one indexed query instead of an aggregate
+over Message per conversation. The signals in chats.signals call
+message_created/message_deleted. Code that bypasses signals
+(bulk_create, queryset.delete) calls refresh for the conversations it
+touched. The backfill_conversation_summaries command rebuilds them all.
+
+Every change also bumps Conversation.version and updated_at, the
+validators chats.conditional answers conditional GETs with.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Now, Substr
+
+from .models import Conversation, Message
+
+PREVIEW_LENGTH = Conversation._meta.get_field("last_message_preview").max_length
+
+
+def message_created(message):
+    """
+    Count a new message and make it the latest one unless a newer exists
+    """
+    conversations = Conversation.objects.filter(pk=message.conversation_id)
+    conversations.update(message_count=F("message_count") + 1, **_changed())
+    conversations.filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.sent_at)
+    ).update(
+        last_message_at=message.sent_at,
+        last_message_preview=message.message_body[:PREVIEW_LENGTH],
+        last_sender=message.sender_id,
+    )
+
+
+# fields of a user that conversation and message bodies embed
+DISPLAYED_USER_FIELDS = ("first_name", "last_name")
+
+
+def user_renamed(user_id):
+    """
+    Mark changed every conversation that shows the user's name: those they
+    take part in and those holding messages they sent
+    """
+    Participant = Conversation.participants.through
+    return Conversation.objects.filter(
+        Q(pk__in=Participant.objects.filter(user_id=user_id).values("conversation_id"))
+        | Q(pk__in=Message.objects.filter(sender_id=user_id).values("conversation_id"))
+    ).update(**_changed())
+
+
+def _changed():
+    """
+    Fields that mark a conversation as changed for conditional GETs
+    """
+    return {"version": F("version") + 1, "updated_at": Now()}
+
+
+def touch(conversation_ids):
+    """
+    Mark conversations changed without touching their summaries, e.g. after
+    a message edit or a participant change
+    """
+    return Conversation.objects.filter(pk__in=conversation_ids).update(**_changed())
+
+
+def message_deleted(message):
+    """
+    Recompute the summary, the deleted message may have been the latest
+    """
+    refresh([message.conversation_id])
+
+
+def refresh(conversation_ids=None):
+    """
+    Rebuild the summaries of the given conversations (all when None) from
+    their messages, in a single UPDATE
+    """
+    latest = Message.objects.filter(
+        conversation=OuterRef("pk")
+    ).order_by("-sent_at", "-message_id")
+    counts = (
+        Message.objects.filter(conversation=OuterRef("pk"))
+        .order_by()
+        .values("conversation")
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    conversations = Conversation.objects.all()
+    if conversation_ids is not None:
+        conversations = conversations.filter(pk__in=conversation_ids)
+    return conversations.update(
+        message_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0)),
+        last_message_at=Subquery(latest.values("sent_at")[:1]),
+        last_message_preview=Coalesce(
+            Substr(Subquery(latest.values("message_body")[:1]), 1, PREVIEW_LENGTH),
+            Value(""),
+        ),
+        last_sender=Subquery(latest.values("sender")[:1]),
+        **_changed(),
+    )
@@ -1,3 +1,1010 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import re
+import uuid
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import Http404
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.exceptions import AuthenticationFailed, NotFound, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import fast_serializers, pubsub, push, summaries
+from .auth import CustomJWTAuthentication, user_cache
+from .fieldsets import Fieldset
+from .ids import uuid7, uuid7_time
+from .membership import is_participant, member_conversation_ids
+from .models import Conversation, Message, User
+from .pagination import (
+    MessageCursorPagination, MessageIdCursorPagination, MessagePagination,
+    MessageSearchPagination
+)
+from .search import FullTextSearchFilter
+from .permissions import IsMessageOwner, IsParticipantOfConversation
+from .serializers import ConversationListSerializer
+from .views import ConversationViewSet, MessageViewSet
+
+factory = APIRequestFactory()
+
+
+def make_user(name):
+    return User.objects.create(
+        first_name=name, last_name="Test", email=f"{name}@example.com",
+        password="x", role="guest"
+    )
+
+
+def call_action(viewset_class, action, url, user, data=None, headers=None, **kwargs):
+    """
+    Run a viewset action for user without the authentication layer;
+    with data it is a JSON POST, headers are extra request META
+    """
+    view = viewset_class()
+    view.action = action
+    view.format_kwarg = None
+    view.kwargs = kwargs
+    if data is None:
+        view.action_map = {"get": action}
+        view.request = Request(factory.get(url, **(headers or {})))
+    else:
+        view.action_map = {"post": action}
+        view.request = Request(factory.post(url, data, format="json"),
+                               parsers=[JSONParser()])
+    view.request.user = user
+    return getattr(view, action)(view.request, **kwargs)
+
+
+def make_messages(conversation, sender, count, start=None, step=1):
+    """
+    count messages, step seconds apart; step=0 gives identical sent_at
+    """
+    start = start or timezone.now() - timedelta(days=1)
+    messages = Message.objects.bulk_create(
+        Message(conversation=conversation, sender=sender,
+                message_body=f"message {i}")
+        for i in range(count)
+    )
+    for i, message in enumerate(messages):
+        message.sent_at = start + timedelta(seconds=i * step)
+    Message.objects.bulk_update(messages, ["sent_at"])
+    return messages
+
+
+class MessageCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.conversation = Conversation.objects.create()
+        cls.conversation.participants.add(cls.alice)
+        # a run of identical timestamps forces the message_id tie-break
+        make_messages(cls.conversation, cls.alice, 25)
+        make_messages(cls.conversation, cls.alice, 20,
+                      start=timezone.now() - timedelta(hours=1), step=0)
+
+    def paginate(self, url):
+        paginator = MessageCursorPagination()
+        request = Request(factory.get(url))
+        queryset = Message.objects.filter(
+            conversation__participants=self.alice)
+        page = paginator.paginate_queryset(queryset, request)
+        return page, paginator
+
+    def expected_order(self):
+        return list(Message.objects.order_by("-sent_at", "-message_id")
+                    .values_list("message_id", flat=True))
+
+    def test_walks_every_message_once_newest_first(self):
+        seen = []
+        url = "/messages/?pagination=cursor&page_size=10"
+        while url:
+            with self.assertNumQueries(1):
+                page, paginator = self.paginate(url)
+            seen.extend(message.message_id for message in page)
+            url = paginator.get_next_link()
+        self.assertEqual(seen, self.expected_order())
+
+    def test_previous_link_returns_the_same_page(self):
+        first, paginator = self.paginate("/messages/?page_size=10")
+        self.assertIsNone(paginator.get_previous_link())
+        second, paginator = self.paginate(paginator.get_next_link())
+        back, paginator = self.paginate(paginator.get_previous_link())
+        self.assertEqual(back, first)
+        self.assertIsNotNone(paginator.get_next_link())
+
+    def test_new_messages_do_not_shift_pages(self):
+        first, paginator = self.paginate("/messages/?page_size=10")
+        next_url = paginator.get_next_link()
+        make_messages(self.conversation, self.alice, 5,
+                      start=timezone.now())
+        second, _ = self.paginate(next_url)
+        self.assertEqual([m.message_id for m in second],
+                         self.expected_order()[15:25])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(NotFound):
+            self.paginate("/messages/?cursor=not-a-cursor")
+
+    def test_viewset_picks_paginator_from_query(self):
+        for url, expected in [
+            ("/messages/", MessagePagination),
+            ("/messages/?pagination=cursor", MessageCursorPagination),
+            ("/messages/?cursor=abc", MessageCursorPagination),
+            ("/messages/?pagination=id&cursor=abc", MessageIdCursorPagination),
+        ]:
+            view = MessageViewSet()
+            view.request = Request(factory.get(url))
+            self.assertIsInstance(view.paginator, expected)
+
+
+class ConversationListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.conversations = []
+        for _ in range(3):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(cls.alice, cls.bob)
+            make_messages(conversation, cls.bob, 12)
+            cls.conversations.append(conversation)
+
+    def test_embeds_only_recent_messages_in_three_queries(self):
+        queryset = ConversationListSerializer.prefetch(
+            Conversation.objects.filter(participants=self.alice), limit=4)
+        # conversations, participants, ranked messages with their senders
+        with self.assertNumQueries(3):
+            data = ConversationListSerializer(queryset, many=True).data
+        self.assertEqual(len(data), 3)
+        for item in data:
+            conversation = Conversation.objects.get(
+                pk=item["conversation_id"])
+            latest = conversation.messages.order_by("-sent_at")[:4]
+            self.assertEqual(
+                [message["message_id"] for message in item["messages"]],
+                [str(message.message_id) for message in latest])
+            self.assertEqual(len(item["participants"]), 2)
+
+    def test_messages_action_is_paginated(self):
+        conversation = self.conversations[0]
+        response = call_action(
+            ConversationViewSet, "messages",
+            "/conversations/x/messages/?pagination=cursor&page_size=5",
+            self.alice, pk=conversation.pk)
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIsNotNone(response.data["next"])
+        self.assertEqual(
+            {message["conversation"] for message in response.data["results"]},
+            {conversation.pk})
+
+
+class MembershipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.conversation = Conversation.objects.create()
+        cls.conversation.participants.add(cls.alice)
+        cls.message = make_messages(cls.conversation, cls.alice, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_single_exists_query_memoized_per_request(self):
+        request = Request(factory.get("/"))
+        request.user = self.alice
+        with self.assertNumQueries(1):
+            self.assertTrue(is_participant(self.alice, self.conversation, request))
+            self.assertTrue(is_participant(self.alice, self.conversation.pk, request))
+        with self.assertNumQueries(1):
+            self.assertFalse(is_participant(self.bob, self.conversation, request))
+
+    def test_permissions_share_the_request_memo(self):
+        request = Request(factory.patch("/"))
+        request.user = self.alice
+        with self.assertNumQueries(1):
+            self.assertTrue(IsParticipantOfConversation().has_object_permission(
+                request, None, self.message))
+            self.assertTrue(IsParticipantOfConversation().has_object_permission(
+                request, None, self.conversation))
+            self.assertTrue(IsMessageOwner().has_object_permission(
+                request, None, self.message))
+
+    @override_settings(CHATS_PARTICIPANTS_CACHE_TTL=60)
+    def test_cached_ids_are_invalidated_on_change(self):
+        with self.assertNumQueries(1):
+            self.assertFalse(is_participant(self.bob, self.conversation))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_participant(self.alice, self.conversation))
+
+        self.conversation.participants.add(self.bob)
+        self.assertTrue(is_participant(self.bob, self.conversation))
+
+        self.bob.conversations.remove(self.conversation)
+        self.assertFalse(is_participant(self.bob, self.conversation))
+
+        self.alice.conversations.clear()
+        self.assertFalse(is_participant(self.alice, self.conversation))
+
+
+class BulkSendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.ours = Conversation.objects.create()
+        cls.ours.participants.add(cls.alice)
+        cls.theirs = Conversation.objects.create()
+        cls.theirs.participants.add(cls.bob)
+
+    def send(self, data):
+        return call_action(MessageViewSet, "bulk", "/messages/bulk/",
+                           self.alice, data=data)
+
+    def test_creates_all_in_constant_queries(self):
+        items = [{"conversation": str(self.ours.pk), "message_body": f"hi {i}"}
+                 for i in range(150)]
+        # membership, then the insert and summary update in a savepoint
+        with self.assertNumQueries(5):
+            response = self.send(items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 150)
+        self.assertEqual([r["index"] for r in response.data["results"]],
+                         list(range(150)))
+        self.assertEqual(self.ours.messages.count(), 150)
+        self.assertTrue(all(m.sender_id == self.alice.pk
+                            for m in self.ours.messages.all()))
+
+    def test_reports_per_item_results(self):
+        response = self.send({"messages": [
+            {"conversation": str(self.ours.pk), "message_body": "ok"},
+            {"conversation": str(self.theirs.pk), "message_body": "nope"},
+            {"conversation": "not-a-uuid", "message_body": "bad"},
+            {"conversation": str(self.ours.pk)},
+        ]})
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r["status"] for r in response.data["results"]],
+                         [201, 403, 400, 400])
+        self.assertEqual(Message.objects.count(), 1)
+        self.ours.refresh_from_db()
+        self.assertEqual(self.ours.message_count, 1)
+        self.assertEqual(self.ours.last_message_preview, "ok")
+
+    def test_rejects_non_list(self):
+        self.assertEqual(self.send({"message_body": "x"}).status_code, 400)
+        self.assertEqual(self.send([]).status_code, 400)
+
+
+class ConversationSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.conversation = Conversation.objects.create()
+        cls.conversation.participants.add(cls.alice, cls.bob)
+
+    def summary(self, conversation=None):
+        conversation = conversation or self.conversation
+        conversation.refresh_from_db()
+        return (conversation.message_count, conversation.last_message_preview,
+                conversation.last_sender_id)
+
+    def test_maintained_on_create_and_delete(self):
+        first = Message.objects.create(conversation=self.conversation,
+                                       sender=self.alice, message_body="first")
+        self.assertEqual(self.summary(), (1, "first", self.alice.pk))
+        second = Message.objects.create(conversation=self.conversation,
+                                        sender=self.bob, message_body="x" * 500)
+        self.assertEqual(self.summary(), (2, "x" * 100, self.bob.pk))
+        self.assertEqual(self.conversation.last_message_at, second.sent_at)
+
+        second.delete()
+        self.assertEqual(self.summary(), (1, "first", self.alice.pk))
+        first.delete()
+        self.assertEqual(self.summary(), (0, "", None))
+        self.assertIsNone(self.conversation.last_message_at)
+
+    def test_backfill_command(self):
+        other = Conversation.objects.create()
+        # bulk_create bypasses the signals, like pre-existing rows
+        messages = make_messages(self.conversation, self.bob, 7)
+        Conversation.objects.update(message_count=0)
+        call_command("backfill_conversation_summaries", batch_size=1,
+                     stdout=io.StringIO())
+        self.assertEqual(self.summary(), (7, messages[-1].message_body, self.bob.pk))
+        self.assertEqual(self.summary(other), (0, "", None))
+
+    def test_inbox_ordered_by_latest_activity(self):
+        quiet = Conversation.objects.create()
+        quiet.participants.add(self.alice)
+        busy = Conversation.objects.create()
+        busy.participants.add(self.alice)
+        Message.objects.create(conversation=self.conversation,
+                               sender=self.alice, message_body="older")
+        Message.objects.create(conversation=busy,
+                               sender=self.alice, message_body="newer")
+        view = ConversationViewSet()
+        view.action = "list"
+        view.request = Request(factory.get("/conversations/"))
+        view.request.user = self.alice
+        self.assertEqual(list(view.get_queryset()),
+                         [busy, self.conversation, quiet])
+
+
+class FullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.ours = Conversation.objects.create()
+        cls.ours.participants.add(cls.alice)
+        cls.theirs = Conversation.objects.create()
+        cls.theirs.participants.add(cls.bob)
+        bodies = [
+            "deploy the release tonight",
+            "release notes are ready",
+            "release release release",
+            "lunch?",
+            "the Release candidate failed",
+        ]
+        for body in bodies:
+            Message.objects.create(conversation=cls.ours, sender=cls.alice,
+                                   message_body=body)
+        Message.objects.create(conversation=cls.theirs, sender=cls.bob,
+                               message_body="secret release plans")
+
+    def search(self, text, cursor=None, page_size=10):
+        url = f"/messages/?search={text}&page_size={page_size}"
+        if cursor:
+            url = cursor
+        request = Request(factory.get(url))
+        queryset = Message.objects.filter(conversation__participants=self.alice)
+        queryset = FullTextSearchFilter().filter_queryset(request, queryset, None)
+        paginator = MessageSearchPagination()
+        return paginator.paginate_queryset(queryset, request), paginator
+
+    def bodies(self, page):
+        return [message.message_body for message in page]
+
+    def test_ranked_matches_within_visible_messages(self):
+        page, _ = self.search("release")
+        self.assertEqual(self.bodies(page)[0], "release release release")
+        self.assertEqual(len(page), 4)
+        self.assertNotIn("secret release plans", self.bodies(page))
+        ranks = [message.search_rank for message in page]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+
+    def test_index_follows_updates_and_deletes(self):
+        message = Message.objects.get(message_body="lunch?")
+        message.message_body = "lunch after the release"
+        message.save()
+        Message.objects.filter(message_body="release notes are ready").delete()
+        page, _ = self.search("release")
+        self.assertIn("lunch after the release", self.bodies(page))
+        self.assertNotIn("release notes are ready", self.bodies(page))
+
+    def test_cursor_walks_results_once(self):
+        everything, _ = self.search("release")
+        seen, url = [], None
+        while True:
+            page, paginator = self.search("release", cursor=url, page_size=1)
+            seen.extend(page)
+            url = paginator.get_next_link()
+            if url is None:
+                break
+        self.assertEqual(seen, everything)
+
+    def test_query_syntax_is_escaped(self):
+        page, _ = self.search('release" OR (')
+        self.assertEqual(page, [])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.carol = make_user("carol")
+        cls.conversation = Conversation.objects.create()
+        cls.conversation.participants.add(cls.alice, cls.bob)
+        cls.message = Message.objects.create(
+            conversation=cls.conversation, sender=cls.bob, message_body="hi")
+
+    def get_messages(self, user=None, **headers):
+        return call_action(
+            ConversationViewSet, "messages", "/conversations/x/messages/",
+            user or self.alice, headers=headers, pk=self.conversation.pk)
+
+    def get_inbox(self, **headers):
+        return call_action(ConversationViewSet, "list", "/conversations/",
+                           self.alice, headers=headers)
+
+    def test_messages_not_modified_after_one_query(self):
+        first = self.get_messages()
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(1):
+            again = self.get_messages(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+        Message.objects.create(conversation=self.conversation,
+                               sender=self.alice, message_body="news")
+        changed = self.get_messages(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+    def test_if_modified_since(self):
+        Conversation.objects.filter(pk=self.conversation.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=2))
+        first = self.get_messages()
+        again = self.get_messages(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(again.status_code, 304)
+
+        # any later change falls in a later second than the date sent back
+        Message.objects.create(conversation=self.conversation,
+                               sender=self.alice, message_body="news")
+        changed = self.get_messages(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(changed.status_code, 200)
+
+    def test_no_last_modified_within_the_changed_second(self):
+        # until the second is over a further change could share its date
+        Conversation.objects.filter(pk=self.conversation.pk).update(
+            updated_at=timezone.now() + timedelta(seconds=5))
+        self.assertNotIn("Last-Modified", self.get_messages())
+
+    def test_inbox_ignores_if_modified_since(self):
+        first = self.get_inbox()
+        self.assertNotIn("Last-Modified", first)
+        date = http_date(timezone.now().timestamp() + 60)
+        self.assertEqual(self.get_inbox(HTTP_IF_MODIFIED_SINCE=date).status_code, 200)
+
+        # leaving the latest conversation takes its updated_at out of the max
+        older = Conversation.objects.create()
+        older.participants.add(self.alice)
+        Conversation.objects.filter(pk=older.pk).update(
+            updated_at=timezone.now() - timedelta(days=1))
+        before = self.get_inbox()
+        self.conversation.participants.remove(self.alice)
+        left = self.get_inbox(HTTP_IF_NONE_MATCH=before["ETag"])
+        self.assertEqual(left.status_code, 200)
+
+    def test_renaming_a_user_changes_validators(self):
+        inbox = self.get_inbox()
+        messages = self.get_messages()
+        self.carol.first_name = "renamed"
+        self.carol.save()
+        self.assertEqual(self.get_inbox(HTTP_IF_NONE_MATCH=inbox["ETag"]).status_code, 304)
+
+        self.bob.first_name = "robert"
+        self.bob.save()
+        self.assertEqual(self.get_inbox(HTTP_IF_NONE_MATCH=inbox["ETag"]).status_code, 200)
+        self.assertEqual(
+            self.get_messages(HTTP_IF_NONE_MATCH=messages["ETag"]).status_code, 200)
+
+        # saves that leave the name alone keep the validators
+        inbox = self.get_inbox()
+        self.bob.phone_number = "555"
+        self.bob.save()
+        self.assertEqual(self.get_inbox(HTTP_IF_NONE_MATCH=inbox["ETag"]).status_code, 304)
+
+    def test_validators_are_per_user(self):
+        first = self.get_messages()
+        other = self.get_messages(user=self.bob, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(other.status_code, 200)
+        with self.assertRaises(Http404):
+            self.get_messages(user=self.carol, HTTP_IF_NONE_MATCH=first["ETag"])
+
+    def test_malformed_pk_is_not_found(self):
+        with self.assertRaises(Http404):
+            call_action(ConversationViewSet, "messages", "/conversations/x/messages/",
+                        self.alice, pk="not-a-uuid")
+
+    def test_inbox_changes_with_edits_and_participants(self):
+        first = self.get_inbox()
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_inbox(HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        self.message.message_body = "edited"
+        self.message.save()
+        edited = self.get_inbox(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(edited.status_code, 200)
+
+        self.conversation.participants.add(self.carol)
+        joined = self.get_inbox(HTTP_IF_NONE_MATCH=edited["ETag"])
+        self.assertEqual(joined.status_code, 200)
+
+
+def render_both(viewset_class, url, user):
+    """
+    Rendered JSON of a list through the ModelSerializer path and through
+    the fast path
+    """
+    slow = type("Slow" + viewset_class.__name__, (viewset_class,),
+                {"fast_read": False})
+    responses = [call_action(view, "list", url, user)
+                 for view in (slow, viewset_class)]
+    return [JSONRenderer().render(response.data) for response in responses]
+
+
+class FastReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.carol = make_user("carol")
+        for _ in range(3):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(cls.bob, cls.carol, cls.alice)
+            make_messages(conversation, cls.bob, 8)
+        summaries.refresh()
+        # one conversation without messages keeps the null summary fields
+        Conversation.objects.create().participants.add(cls.alice)
+
+    def both(self, viewset_class, url):
+        return render_both(viewset_class, url, self.alice)
+
+    def test_messages_match_model_serializer(self):
+        for url in ("/messages/", "/messages/?pagination=cursor&page_size=5",
+                    "/messages/?search=message"):
+            slow, fast = self.both(MessageViewSet, url)
+            self.assertEqual(fast, slow, url)
+            self.assertIn(b"message_body", fast)
+
+    def test_conversations_match_model_serializer(self):
+        slow, fast = self.both(ConversationViewSet, "/conversations/")
+        self.assertEqual(fast, slow)
+
+    def test_conversations_in_constant_queries(self):
+        rows = fast_serializers.conversation_plan().values(
+            Conversation.objects.filter(participants=self.alice))
+        # conversations, participants, ranked messages with their senders
+        with self.assertNumQueries(3):
+            data = fast_serializers.render_conversations(rows, recent_limit=2)
+        self.assertEqual(sorted(len(item["messages"]) for item in data),
+                         [0, 2, 2, 2])
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        for _ in range(2):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(cls.alice, cls.bob)
+            make_messages(conversation, cls.bob, 6)
+        summaries.refresh()
+
+    def list(self, viewset_class, url):
+        slow, fast = render_both(viewset_class, url, self.alice)
+        self.assertEqual(fast, slow, url)
+        return json.loads(fast)
+
+    def test_message_fields(self):
+        for url in ("/messages/?fields=message_id,sent_at",
+                    "/messages/?fields=message_id,sent_at&pagination=cursor&page_size=4"):
+            data = self.list(MessageViewSet, url)
+            self.assertEqual(set(data["results"][0]), {"message_id", "sent_at"})
+
+    def test_unrequested_relations_are_not_joined(self):
+        with CaptureQueriesContext(connection) as queries:
+            call_action(MessageViewSet, "list", "/messages/?fields=message_id", self.alice)
+        self.assertNotIn('"chats_user"', queries[-1]["sql"])
+        self.assertNotIn("message_body", queries[-1]["sql"])
+
+        plan = fast_serializers.conversation_plan(
+            Fieldset.parse("conversation_id,message_count"))
+        rows = list(plan.values(Conversation.objects.all()))
+        # no participant or message queries
+        with self.assertNumQueries(0):
+            data = fast_serializers.render_conversations(rows, 5, plan)
+        self.assertEqual(set(data[0]), {"conversation_id", "message_count"})
+
+    def test_plans_are_compiled_once(self):
+        plan = fast_serializers.message_plan(Fieldset.parse("message_id,sent_at"))
+        self.assertIs(fast_serializers.message_plan(Fieldset.parse("sent_at,message_id")), plan)
+        self.assertIs(fast_serializers.message_plan(), fast_serializers.message_plan())
+        expanded = fast_serializers.message_plan(Fieldset.parse("message_id,sender", "sender"))
+        self.assertIsNot(expanded, fast_serializers.message_plan(Fieldset.parse("message_id,sender")))
+        with patch.object(fast_serializers.FieldPlan, "compile") as compile_plan:
+            self.list(MessageViewSet, "/messages/?fields=message_id,sent_at")
+        compile_plan.assert_not_called()
+
+    def test_conversation_nested_fields_and_expand(self):
+        data = self.list(
+            ConversationViewSet,
+            "/conversations/?fields=conversation_id,participants,last_sender,"
+            "messages.message_id,messages.sender&expand=participants,messages.sender")
+        conversation = data["results"][0]
+        self.assertEqual(list(conversation),
+                         ["conversation_id", "participants", "messages", "last_sender"])
+        self.assertEqual(conversation["participants"][0]["first_name"], "alice")
+        self.assertEqual(conversation["messages"][0]["sender"],
+                         {"user_id": str(self.bob.pk), "first_name": "bob", "last_name": "Test"})
+        self.assertEqual(conversation["last_sender"], str(self.bob.pk))
+
+    def test_retrieve_narrows_the_query(self):
+        conversation = Conversation.objects.first()
+        with CaptureQueriesContext(connection) as queries:
+            response = call_action(
+                ConversationViewSet, "retrieve",
+                "/conversations/x/?fields=conversation_id,last_sender&expand=last_sender",
+                self.alice, pk=conversation.pk)
+        self.assertEqual(response.data["last_sender"]["first_name"], "bob")
+        # the object with its last sender joined, then the permission check
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn("last_message_preview", queries[0]["sql"])
+
+    def test_unknown_fields_are_rejected(self):
+        for url in ("/messages/?fields=nope", "/messages/?expand=message_body",
+                    "/messages/?fields=sender.first_name"):
+            with self.assertRaises(ValidationError):
+                call_action(MessageViewSet, "list", url, self.alice)
+
+
+class TimeOrderedIdTests(TestCase):
+    def test_uuid7_increases_within_a_millisecond(self):
+        ids = [uuid7() for _ in range(5000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual({value.version for value in ids}, {7})
+        self.assertEqual({value.variant for value in ids}, {uuid.RFC_4122})
+        self.assertLess(abs(uuid7_time(ids[0]) - timezone.now()), timedelta(seconds=5))
+
+    def test_uuid7_from_a_time(self):
+        when = timezone.now() - timedelta(days=30)
+        self.assertEqual(uuid7_time(uuid7(when)),
+                         when.replace(microsecond=when.microsecond // 1000 * 1000))
+        self.assertIsNone(uuid7_time(uuid.uuid4()))
+
+    def test_id_keyset_walks_history_newest_first(self):
+        alice = make_user("alice")
+        conversation = Conversation.objects.create()
+        make_messages(conversation, alice, 23)
+        seen = []
+        url = "/messages/?pagination=id&page_size=5"
+        while url:
+            paginator = MessageIdCursorPagination()
+            with self.assertNumQueries(1):
+                page = paginator.paginate_queryset(
+                    Message.objects.all(), Request(factory.get(url)))
+            seen.extend(message.message_id for message in page)
+            url = paginator.get_next_link()
+        self.assertEqual(seen, list(Message.objects.order_by("-sent_at")
+                                    .values_list("message_id", flat=True)))
+
+        back = paginator.get_previous_link()
+        page = paginator.paginate_queryset(Message.objects.all(), Request(factory.get(back)))
+        self.assertEqual([message.message_id for message in page], seen[15:20])
+
+    def test_rekey_command(self):
+        start = timezone.now() - timedelta(days=2)
+        alice = User.objects.create(
+            user_id=uuid.uuid4(), first_name="alice", last_name="Test",
+            email="alice@example.com", password="x", role="guest")
+        bob = User.objects.create(
+            user_id=uuid.uuid4(), first_name="bob", last_name="Test",
+            email="bob@example.com", password="x", role="guest")
+        conversation = Conversation.objects.create(conversation_id=uuid.uuid4())
+        conversation.participants.add(alice, bob)
+        Message.objects.bulk_create(
+            Message(message_id=uuid.uuid4(), conversation=conversation,
+                    sender=(alice, bob)[i % 2], message_body=f"old message {i}")
+            for i in range(7)
+        )
+        for i, message in enumerate(Message.objects.order_by("message_body")):
+            message.sent_at = start + timedelta(minutes=i)
+            message.save(update_fields=["sent_at"])
+        summaries.refresh()
+
+        call_command("rekey_uuid7", batch_size=3, stdout=io.StringIO())
+
+        for model in (User, Conversation, Message):
+            self.assertEqual({pk.version for pk in model.objects.values_list("pk", flat=True)}, {7})
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.messages.count(), 7)
+        self.assertEqual(conversation.participants.count(), 2)
+        self.assertEqual(conversation.last_sender.first_name, "alice")
+        self.assertEqual(list(Message.objects.order_by("message_id")),
+                         list(Message.objects.order_by("sent_at")))
+        self.assertEqual(FullTextSearchFilter().filter_queryset(
+            Request(factory.get("/messages/?search=message")),
+            Message.objects.all(), None).count(), 7)
+        # a second run finds nothing left to do
+        out = io.StringIO()
+        call_command("rekey_uuid7", stdout=out)
+        self.assertIn("0 messages rekeyed", out.getvalue())
+
+
+def query_plan(sql):
+    """
+    (full scans, sorts) in the plan of sql: the tables read without an
+    index, and for each sort the table the statement reads from
+    """
+    table = re.search(r'FROM "(\w+)"', sql).group(1)
+    scans, sorts = [], []
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            source = None
+            for detail in (row[-1] for row in cursor.fetchall()):
+                words = detail.split()
+                if words[0] in ("SCAN", "SEARCH"):
+                    source = words[1]
+                    if words[0] == "SCAN" and "USING" not in words and not source.startswith("("):
+                        if source != "qualify":
+                            scans.append(source)
+                elif detail.startswith("USE TEMP B-TREE FOR") and "ORDER BY" in detail:
+                    # ordering the filtered output of a window function
+                    # only sorts the few rows per partition it kept
+                    if source != "qualify":
+                        sorts.append(table)
+        else:
+            cursor.execute("EXPLAIN " + sql)
+            columns = [column[0] for column in cursor.description]
+            for row in cursor.fetchall():
+                row = dict(zip(columns, row))
+                if row["type"] == "ALL":
+                    scans.append(row["table"])
+                if "filesort" in (row["Extra"] or ""):
+                    sorts.append(table)
+    return scans, sorts
+
+
+@skipUnlessDBFeature("supports_explaining_query_execution")
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN of every query the chats endpoints run. A plan fails when it
+    reads a table without an index or sorts rows; the only sorts accepted
+    are over a set an index already cut down to one user's conversations
+    or to one page (sorted_tables)
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.carol = make_user("carol")
+        cls.conversations = []
+        for others in ((cls.bob,), (cls.carol,), (cls.bob, cls.carol)):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(cls.alice, *others)
+            make_messages(conversation, others[0], 30)
+            cls.conversations.append(conversation)
+        # rows alice can't see, so that the plans have something to skip
+        hidden = Conversation.objects.create()
+        hidden.participants.add(cls.bob, cls.carol)
+        make_messages(hidden, cls.bob, 30)
+        summaries.refresh()
+
+    def assertIndexed(self, run, sorted_tables=()):
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        checked = 0
+        for query in queries:
+            sql = query["sql"]
+            if not sql.startswith(("SELECT", "UPDATE", "DELETE")):
+                continue
+            scans, sorts = query_plan(sql)
+            self.assertEqual(scans, [], f"full scan in {sql}")
+            self.assertEqual([table for table in sorts if table not in sorted_tables], [],
+                             f"sort in {sql}")
+            checked += 1
+        self.assertGreater(checked, 0)
+
+    def history(self, query=""):
+        return call_action(
+            ConversationViewSet, "messages", "/conversations/x/messages/" + query,
+            self.alice, pk=self.conversations[2].pk)
+
+    def test_conversation_history(self):
+        for pagination in ("", "?pagination=cursor&page_size=5", "?pagination=id&page_size=5"):
+            first = self.history(pagination)
+            self.assertIndexed(lambda: self.history(pagination))
+            self.assertIndexed(lambda: self.history("?" + first.data["next"].split("?")[1]))
+
+    def test_message_timeline(self):
+        # newest first across the user's conversations: the rows are found
+        # per conversation through the (user, conversation) and
+        # (conversation, sent_at) indexes, merging them takes a sort
+        for url in ("/messages/", "/messages/?pagination=cursor&page_size=5",
+                    "/messages/?fields=message_id"):
+            self.assertIndexed(lambda: call_action(MessageViewSet, "list", url, self.alice),
+                               sorted_tables=("chats_message",))
+        message = self.conversations[0].messages.all()[0]
+        self.assertIndexed(lambda: call_action(MessageViewSet, "retrieve", "/messages/x/",
+                                               self.alice, pk=message.pk))
+
+    def test_inbox(self):
+        # the user's conversations by activity, and one page's participants
+        # by name (read from the through table, or prefetched from users)
+        sorted_tables = ("chats_conversation", "chats_conversation_participants", "chats_user")
+        self.assertIndexed(lambda: call_action(ConversationViewSet, "list", "/conversations/",
+                                               self.alice), sorted_tables)
+        self.assertIndexed(lambda: call_action(ConversationViewSet, "retrieve", "/conversations/x/",
+                                               self.alice, pk=self.conversations[0].pk), sorted_tables)
+
+    def test_membership_and_summaries(self):
+        conversation = self.conversations[0]
+        ids = [c.pk for c in self.conversations]
+        self.assertIndexed(lambda: is_participant(self.alice, conversation))
+        self.assertIndexed(lambda: member_conversation_ids(self.alice, ids))
+        self.assertIndexed(lambda: summaries.refresh(ids))
+        self.assertIndexed(lambda: call_action(
+            MessageViewSet, "bulk", "/messages/bulk/", self.alice,
+            data=[{"conversation": str(pk), "message_body": "hi"} for pk in ids]))
+
+
+# the project's user model, which has no is_active
+@override_settings(AUTH_USER_MODEL="chats.User")
+class CachedAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user("dana")
+
+    def setUp(self):
+        # as the project's SIMPLE_JWT, with revocation on password change;
+        # simplejwt's modules keep the api_settings object they imported
+        self.enterContext(patch.object(jwt_settings, "USER_ID_FIELD", "user_id"))
+        self.enterContext(patch.object(jwt_settings, "CHECK_REVOKE_TOKEN", True))
+        cache.clear()
+        user_cache.clear_local()
+        self.token = str(AccessToken.for_user(self.user))
+
+    def authenticate(self):
+        request = Request(factory.get("/", HTTP_AUTHORIZATION=f"Bearer {self.token}"))
+        return CustomJWTAuthentication().authenticate(request)[0]
+
+    def test_repeat_requests_run_no_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(), self.user)
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        # a copy: changing it must not leak into the next request
+        user.first_name = "changed"
+        self.assertEqual(self.authenticate().first_name, "dana")
+
+    def test_shared_cache_serves_other_processes(self):
+        self.authenticate()
+        user_cache.clear_local()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(), self.user)
+
+    def test_saves_and_password_change_invalidate(self):
+        self.authenticate()
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = "renamed"
+        user.save()
+        user_cache.clear_local()  # as another process past its local TTL
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate().first_name, "renamed")
+
+        user.password = "second"
+        user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class PushTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = make_user("alice")
+        cls.bob = make_user("bob")
+        cls.eve = make_user("eve")
+        cls.conversation = Conversation.objects.create()
+        cls.conversation.participants.add(cls.alice, cls.bob)
+
+    def send(self, body):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(
+                conversation=self.conversation, sender=self.bob, message_body=body
+            )
+
+    async def read(self, events, count=1):
+        """
+        The next count chunks of the stream, skipping keepalives
+        """
+        chunks = []
+        while len(chunks) < count:
+            chunk = await asyncio.wait_for(anext(events), 1)
+            if isinstance(chunk, bytes):
+                chunk = chunk.decode()
+            if not chunk.startswith(":"):
+                chunks.append(chunk)
+        return chunks
+
+    async def open(self, user, last_event_id=None):
+        response = await push.open_stream(user, self.conversation.pk, last_event_id)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+        self.assertTrue((await self.read(events))[0].startswith("retry:"))
+        return events
+
+    async def test_new_messages_are_pushed(self):
+        events = await self.open(self.alice)
+        message = await sync_to_async(self.send)("hello")
+        [chunk] = await self.read(events)
+        self.assertIn(f"id: {message.message_id}\nevent: message\n", chunk)
+        data = json.loads(chunk.split("data: ", 1)[1])
+        self.assertEqual(data["message_body"], "hello")
+        await events.aclose()
+
+    async def test_non_participant_is_refused(self):
+        response = await push.open_stream(self.eve, self.conversation.pk)
+        self.assertEqual(response.status_code, 403)
+
+    async def test_reconnect_replays_missed_messages(self):
+        first = await sync_to_async(self.send)("one")
+        missed = [await sync_to_async(self.send)(body) for body in ("two", "three")]
+        events = await self.open(self.alice, str(first.message_id))
+        chunks = await self.read(events, 2)
+        self.assertEqual(
+            [chunk.split("\n", 1)[0] for chunk in chunks],
+            [f"id: {message.message_id}" for message in missed],
+        )
+        await events.aclose()
+
+    async def test_replay_follows_sent_at_not_ids(self):
+        first = await sync_to_async(self.send)("one")
+
+        def imported():
+            # ids minted before the first message's, e.g. rekeyed or imported
+            with self.captureOnCommitCallbacks(execute=True):
+                return [
+                    Message.objects.create(
+                        message_id=uuid7(timezone.now() - timedelta(days=days)),
+                        conversation=self.conversation, sender=self.bob,
+                        message_body=body)
+                    for days, body in ((1, "two"), (2, "three"))
+                ]
+        missed = await sync_to_async(imported)()
+        events = await self.open(self.alice, str(first.message_id))
+        chunks = await self.read(events, 2)
+        self.assertEqual(
+            [chunk.split("\n", 1)[0] for chunk in chunks],
+            [f"id: {message.message_id}" for message in missed],
+        )
+        await events.aclose()
+
+    @override_settings(CHATS_PUSH_REPLAY_LIMIT=1)
+    async def test_reconnect_after_too_many_gets_overflow(self):
+        first = await sync_to_async(self.send)("one")
+        for body in ("two", "three"):
+            await sync_to_async(self.send)(body)
+        events = await self.open(self.alice, str(first.message_id))
+        self.assertEqual(await self.read(events), ["event: overflow\ndata: {}\n\n"])
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+
+    @override_settings(CHATS_PUSH_QUEUE_SIZE=2)
+    async def test_slow_consumer_is_cut_off(self):
+        subscription = pubsub.subscribe("test")
+        for number in range(3):
+            pubsub.publish("test", {"event": "message", "id": str(number)})
+        await asyncio.sleep(0)
+        with self.assertRaises(pubsub.SlowConsumer):
+            await subscription.get(timeout=1)
+        self.assertFalse(pubsub.has_subscribers("test"))
+
+    async def test_removed_participant_stream_ends(self):
+        events = await self.open(self.bob)
+
+        def remove():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.conversation.participants.remove(self.bob)
+        await sync_to_async(remove)()
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(anext(events), 1)
+        self.assertFalse(pubsub.has_subscribers(push.channel(self.conversation.pk)))
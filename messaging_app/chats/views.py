@@ -1,12 +1,29 @@
+from django.db import transaction
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from .models import Conversation, Message, User
-from .serializers import ConversationSerializer, MessageSerializer
+from .serializers import (
+    ConversationSerializer, ConversationListSerializer, MessageSerializer,
+    MessageBulkItemSerializer
+)
 from rest_framework import viewsets, status, filters  # <-- filters imported
 from rest_framework import viewsets, permissions
 from .permissions import    IsParticipant, IsMessageOwner, IsConversationParticipant, IsParticipantOfConversation
+from .pagination import (
+    MessagePagination, MessageSearchPagination, message_paginator
+)
+from .search import FullTextSearchFilter
+from .membership import (
+    conversations_of, is_participant, member_conversation_ids
+)
+from . import conditional, fast_serializers, push, summaries
+from .fieldsets import Fieldset
+from .filters import MessageFilter
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.exceptions import PermissionDenied
     
 
 # Create your views here.
@@ -197,7 +214,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         conversation = serializer.validated_data['conversation']
         
         # Check if user is participant in the conversation
-        if self.request.user not in conversation.participants.all():
+        if not is_participant(self.request.user, conversation, self.request):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You are not a participant in this conversation")
         
@@ -270,7 +287,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
         user_id = request.data.get('user_id')
         
         # Check if current user is participant
-        if request.user not in conversation.participants.all():
+        if not is_participant(request.user, conversation, request):
             return Response(
                 {"detail": "You must be a participant to add users to this conversation."},
                 status=status.HTTP_403_FORBIDDEN
@@ -307,7 +324,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         conversation = serializer.validated_data['conversation']
         
         # Check if user is participant in the conversation
-        if self.request.user not in conversation.participants.all():
+        if not is_participant(self.request.user, conversation, self.request):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You are not a participant in this conversation")
         
@@ -359,7 +376,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         message = self.get_object()
         
         # Check if user is participant in the conversation
-        if request.user not in message.conversation.participants.all():
+        if not is_participant(request.user, message.conversation_id, request):
             return Response(
                 {"detail": "You must be a participant to mark messages as read."},
                 status=status.HTTP_403_FORBIDDEN
@@ -372,28 +389,89 @@ class MessageViewSet(viewsets.ModelViewSet):
 
 # added pagination and filters... task 2
 
-class MessageViewSet(viewsets.ModelViewSet):
+class FieldsetMixin:
+    """
+    ?fields= and ?expand= for reads, see chats.fieldsets; writes always
+    use and answer every field
+    """
+    @property
+    def fieldset(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return Fieldset.from_request(self.request)
+        return Fieldset()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.fieldset
+        return context
+
+
+class MessageViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Message with pagination, filtering, and custom permissions
     """
     serializer_class = MessageSerializer
     permission_classes = [IsParticipantOfConversation, IsMessageOwner]
     pagination_class = MessagePagination  # Custom pagination
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # full-text search comes last so its rank ordering wins over the default
+    filter_backends = [
+        DjangoFilterBackend, OrderingFilter, FullTextSearchFilter
+    ]
     filterset_class = MessageFilter  # Our custom filter class
-    search_fields = ['content']  # Enable search on message content
-    ordering_fields = ['timestamp', 'read']  # Enable ordering by timestamp and read status
-    ordering = ['-timestamp']  # Default ordering: newest first
+    ordering_fields = ['sent_at']  # Enable ordering by send time
+    ordering = ['-sent_at', '-message_id']  # Default ordering: newest first
+    bulk_max_items = 1000  # Messages accepted by one bulk request
+    fast_read = True  # List from .values() rows, see chats.fast_serializers
+    bulk_batch_size = 500  # Rows per INSERT statement
+
+    @property
+    def paginator(self):
+        """
+        Ranked keyset pagination for ?search=, otherwise keyset or
+        page-number pagination, see message_paginator
+        """
+        if not hasattr(self, '_paginator'):
+            if FullTextSearchFilter().get_search_text(self.request):
+                self._paginator = MessageSearchPagination()
+            else:
+                self._paginator = message_paginator(self.request)
+        return self._paginator
     
+    def list(self, request, *args, **kwargs):
+        """
+        Same output as MessageSerializer, built from .values() rows
+        """
+        if not self.fast_read:
+            return super().list(request, *args, **kwargs)
+        plan = fast_serializers.message_plan(self.fieldset)
+        # the keyset paginators read these even when they are not output
+        extra = ['message_id', 'sent_at']
+        if FullTextSearchFilter().get_search_text(request):
+            extra.append('search_rank')
+        queryset = plan.values(
+            self.filter_queryset(self.get_queryset()), *extra
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                fast_serializers.render_messages(page, plan)
+            )
+        return Response(fast_serializers.render_messages(queryset, plan))
+
     def get_queryset(self):
         """
         Users can only see messages from conversations they participate in
         Apply additional filtering based on query parameters
         """
         user = self.request.user
-        queryset = Message.objects.filter(conversation__participants=user)
+        queryset = Message.objects.filter(
+            conversation__in=conversations_of(user)
+        )
         
-        # Apply additional custom filtering if needed
+        if self.request.method in permissions.SAFE_METHODS:
+            # read only the requested fields, the paginators also need sent_at
+            plan = fast_serializers.message_plan(self.fieldset)
+            return plan.only(queryset, 'sent_at')
         return queryset.select_related('sender', 'conversation')
     
     def perform_create(self, serializer):
@@ -404,7 +482,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         conversation = serializer.validated_data['conversation']
         
         # Check if user is participant in the conversation
-        if self.request.user not in conversation.participants.all():
+        if not is_participant(self.request.user, conversation, self.request):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You are not a participant in this conversation")
         
@@ -465,19 +543,175 @@ class MessageViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(filtered_queryset, many=True)
         return Response(serializer.data)
 
-class ConversationViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Send many messages in one request: POST /messages/bulk/ with a list
+        of {"conversation": id, "message_body": text} (or {"messages": [...]}).
+        Membership is checked once for all the distinct conversations and
+        the valid items are inserted with one bulk_create in a transaction.
+        Answers one result per item, in order: 201 when every item was
+        created, 207 when only some were, 400 when none was.
+        """
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('messages')
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"detail": "Expected a non-empty list of messages."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {"detail":
+                    f"At most {self.bulk_max_items} messages per request."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            serializer = MessageBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index,
+                                  'status': status.HTTP_400_BAD_REQUEST,
+                                  'errors': serializer.errors}
+
+        allowed = member_conversation_ids(
+            request.user, {data['conversation'] for _, data in valid}
+        )
+        to_create = []
+        for index, data in valid:
+            if data['conversation'] not in allowed:
+                results[index] = {
+                    'index': index,
+                    'status': status.HTTP_403_FORBIDDEN,
+                    'errors': {'conversation': [
+                        "You are not a participant in this conversation"
+                    ]},
+                }
+                continue
+            message = Message(conversation_id=data['conversation'],
+                              sender=request.user,
+                              message_body=data['message_body'])
+            to_create.append((index, message))
+
+        with transaction.atomic():
+            Message.objects.bulk_create(
+                [message for _, message in to_create],
+                batch_size=self.bulk_batch_size
+            )
+            # bulk_create sends no post_save, update the summaries and
+            # push the messages here
+            summaries.refresh(
+                {message.conversation_id for _, message in to_create}
+            )
+            push.publish_messages([message for _, message in to_create])
+        for index, message in to_create:
+            results[index] = {'index': index,
+                              'status': status.HTTP_201_CREATED,
+                              'message_id': message.message_id,
+                              'sent_at': message.sent_at}
+
+        if len(to_create) == len(items):
+            response_status = status.HTTP_201_CREATED
+        elif to_create:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'created': len(to_create), 'results': results},
+                        status=response_status)
+
+
+class ConversationViewSet(FieldsetMixin, viewsets.ModelViewSet):
     """
     ViewSet for Conversation (updated to maintain consistency)
     """
     serializer_class = ConversationSerializer
     permission_classes = [IsParticipantOfConversation]
     pagination_class = MessagePagination  # Use same pagination for consistency
+    recent_messages_limit = 5  # Messages embedded per conversation read
+    fast_read = True  # List from .values() rows, see chats.fast_serializers
     
+    def list(self, request, *args, **kwargs):
+        """
+        Inbox listing; polls with matching validators get a 304
+        """
+        validators = conditional.inbox_validators(request)
+        response = conditional.not_modified(request, validators)
+        if response is not None:
+            return response
+        if not self.fast_read:
+            return conditional.set_validators(
+                super().list(request, *args, **kwargs), validators
+            )
+        fieldset = self.fieldset
+        plan = fast_serializers.conversation_plan(fieldset)
+        queryset = plan.values(
+            self.filter_queryset(self.get_queryset()), 'conversation_id'
+        )
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        data = fast_serializers.render_conversations(
+            rows, self.recent_messages_limit, plan,
+            fast_serializers.message_plan(fieldset.nested('messages'))
+        )
+        if page is not None:
+            response = self.get_paginated_response(data)
+        else:
+            response = Response(data)
+        return conditional.set_validators(response, validators)
+
     def get_queryset(self):
         """
         Users can only see conversations they are participants in
         """
-        return Conversation.objects.filter(participants=self.request.user)
+        # Inbox: latest activity first
+        queryset = Conversation.objects.filter(
+            participants=self.request.user
+        ).order_by('-last_message_at', '-created_at')
+        if self.action in ('list', 'retrieve'):
+            fieldset = self.fieldset
+            plan = fast_serializers.conversation_plan(fieldset)
+            queryset = plan.only(queryset)
+            queryset = ConversationListSerializer.prefetch(
+                queryset, self.recent_messages_limit, fieldset
+            )
+        return queryset
+
+    def get_serializer_class(self):
+        """
+        Reads embed only the latest messages, see the messages action
+        """
+        if self.action in ('list', 'retrieve'):
+            return ConversationListSerializer
+        return super().get_serializer_class()
+
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """
+        Full message history of a conversation, newest first and paginated.
+        Polls with a matching If-None-Match/If-Modified-Since get a 304.
+        """
+        validators = conditional.conversation_validators(request, pk)
+        response = conditional.not_modified(request, validators)
+        if response is not None:
+            return response
+        conversation = self.get_object()
+        plan = fast_serializers.message_plan(self.fieldset)
+        queryset = plan.only(conversation.messages.all(), 'sent_at')
+        paginator = message_paginator(request)
+        page = paginator.paginate_queryset(
+            queryset.order_by('-sent_at', '-message_id'), request, view=self
+        )
+        serializer = MessageSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return conditional.set_validators(
+            paginator.get_paginated_response(serializer.data), validators
+        )
     
     def perform_create(self, serializer):
         """
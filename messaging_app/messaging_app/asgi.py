@@ -2,6 +2,8 @@
 ASGI config for messaging_app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (uvicorn, daphne) for the conversation event
+streams of chats.push; under WSGI each open stream holds a worker.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -77,6 +77,8 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # primary key of chats.User
+    'USER_ID_FIELD': 'user_id',
 }
 
 MIDDLEWARE = [
@@ -16,6 +16,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from chats import push
 from chats.views import ConversationViewSet, MessageViewSet
 
 # Added Authentication URLs
@@ -26,6 +27,8 @@ router.register(r'messages', MessageViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Server-Sent Events of a conversation's new messages (ASGI only)
+    path('api/conversations/<uuid:conversation_id>/events/', push.conversation_events),
     path('api/', include(router.urls)),  # Include all router-generated URLs under /api/ if it 
     # didnt passes add: path('api/', include('chats.urls')),
     path('api-auth/', include('rest_framework.urls')),
@@ -2,13 +2,19 @@ import sqlite3
 
 
 # custom context manager DatabaseConnection using the __enter__ and the __exit__ methods
+# pass replica=HotTableReplica(...) (7-hot_replica.py) to serve reads from memory
 class DatabaseConnection():
-    def __init__(self, db_name):
+    def __init__(self, db_name, replica=None):
         self.db_name = db_name
+        self.replica = replica
         self.connection = None
         
     def __enter__(self):
-        connection = sqlite3.connect(self.db_name)
+        if self.replica is not None:
+            # read-only connection to the in-memory copy of the hot tables
+            connection = self.replica.connect()
+        else:
+            connection = sqlite3.connect(self.db_name)
         self.connection = connection
         return self.connection
 
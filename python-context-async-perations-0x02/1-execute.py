@@ -2,28 +2,32 @@ import sqlite3
 
 class ExecuteQuery():
 
-    def __init__(self, user.db, query, params=None) -> None:
-        self.user_db = user.db
+    def __init__(self, user_db, query, params=None, replica=None) -> None:
+        self.user_db = user_db
         self.query = query
         self.params = params or ()
+        self.replica = replica
         self.connection = None
         self.results = None
 
     def __enter__(self):
-        # Open the connection (sqlite3.connect)
-        self.connection = sqlite3.connect(self.user_db)
+        # Open the connection (sqlite3.connect), or read from the in-memory replica
+        if self.replica is not None:
+            self.connection = self.replica.connect()
+        else:
+            self.connection = sqlite3.connect(self.user_db)
         # Create a cursor
         cursor = self.connection.cursor()
         # Execute the query with its parameters (if any)
-        cursor.execute(self.query)        
+        cursor.execute(self.query, self.params)
         # Fetch the results
         self.results = cursor.fetchall()
         # Return the results to the with block
         return self.results
 
-    def __exit__(self, exception_value, exception_type, traceback):
+    def __exit__(self, exception_type, exception_value, traceback):
         # commint when no error
-        if exception is None:
+        if exception_type is None:
             self.connection.commit()
         else:
             # rollback
@@ -38,3 +42,12 @@ with ExecuteQuery("users.db", "SELECT * FROM users WHERE age > ?", (25,)) as res
     print("Users older than 25:")
     for user in results:
         print(user)
+
+# Check: the same query served from the in-memory replica (7-hot_replica.py)
+if __name__ == "__main__":
+    HotTableReplica = __import__('7-hot_replica').HotTableReplica
+    with HotTableReplica("users.db", tables=("users",)) as replica:
+        query = "SELECT * FROM users WHERE age > ?"
+        with ExecuteQuery("users.db", query, (25,), replica=replica) as replica_results:
+            assert replica_results == results, "replica and disk disagree"
+        print(f"replica served the same {len(replica_results)} users")
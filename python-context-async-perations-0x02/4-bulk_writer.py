@@ -0,0 +1,182 @@
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# custom context manager BulkWriter that buffers rows and writes them in batches
+class BulkWriter():
+    """
+    Rows are written once max_rows are buffered, or max_interval seconds
+    after the first of them was buffered: a background thread flushes a
+    writer that goes quiet. When the with block raises, the rows it had
+    already added are still flushed, then its exception propagates.
+    Flushes that fail outside add()/flush() are logged and kept as
+    last_error, which stats() reports.
+    """
+    def __init__(self, db_name, table, columns, max_rows=500, max_interval=1.0):
+        self.db_name = db_name
+        self.table = table
+        self.columns = tuple(columns)
+        if max_interval is not None and max_interval <= 0:
+            # the flusher would wake up in a busy loop
+            raise ValueError("max_interval must be positive or None")
+        self.max_rows = max_rows
+        self.max_interval = max_interval
+        self.connection = None
+        self.buffer = []
+        self.first_buffered_at = None
+        # add() and the background flusher both touch the buffer and connection
+        self.lock = threading.RLock()
+        self.stop_event = threading.Event()
+        self.flusher = None
+        # build the insert once, identifiers are quoted so odd names stay safe
+        column_list = ", ".join(self._quote(column) for column in self.columns)
+        placeholders = ", ".join("?" for _ in self.columns)
+        self.query = (
+            f"INSERT INTO {self._quote(self.table)} ({column_list}) "
+            f"VALUES ({placeholders})"
+        )
+        # counters
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.flush_count = 0
+        self.failed_flushes = 0
+        self.last_flush_latency = 0.0
+        self.total_flush_time = 0.0
+        self.last_error = None
+
+    @staticmethod
+    def _quote(identifier):
+        return '"{}"'.format(identifier.replace('"', '""'))
+
+    def __enter__(self):
+        self.connection = sqlite3.connect(self.db_name, check_same_thread=False)
+        if self.max_interval is not None:
+            self.stop_event.clear()
+            self.flusher = threading.Thread(
+                target=self._flush_loop, name="bulk-writer-flush", daemon=True
+            )
+            self.flusher.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.stop_event.set()
+        if self.flusher is not None:
+            self.flusher.join()
+            self.flusher = None
+        try:
+            if exception_type is None:
+                # write whatever is still buffered
+                self.flush()
+            else:
+                # the rows added before the with block failed are complete,
+                # write them; the block's own exception is the one to raise
+                pending = len(self.buffer)
+                try:
+                    self.flush()
+                except sqlite3.Error:
+                    logger.exception("bulk writer: %d buffered rows not written",
+                                     pending)
+        finally:
+            # close the connection anyway
+            self.connection.close()
+            self.connection = None
+        # propagate exception if needed
+        return False
+
+    def _flush_loop(self):
+        """ flush rows that waited max_interval, also when add() is not called """
+        while not self.stop_event.wait(self.max_interval / 4):
+            with self.lock:
+                if not self.buffer or not self._should_flush():
+                    continue
+                try:
+                    self.flush()
+                except sqlite3.Error:
+                    logger.exception("bulk writer: timed flush failed")
+
+    def add(self, row):
+        """ buffer one row, flushing when a row-count or time threshold is hit """
+        if len(row) != len(self.columns):
+            raise ValueError(
+                f"expected {len(self.columns)} values, got {len(row)}"
+            )
+        with self.lock:
+            if not self.buffer:
+                self.first_buffered_at = time.monotonic()
+            self.buffer.append(tuple(row))
+            if self._should_flush():
+                self.flush()
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def _should_flush(self):
+        if len(self.buffer) >= self.max_rows:
+            return True
+        waited = time.monotonic() - self.first_buffered_at
+        return self.max_interval is not None and waited >= self.max_interval
+
+    def flush(self):
+        """ write the buffered rows with executemany inside one transaction """
+        with self.lock:
+            return self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return 0
+        batch = self.buffer
+        self.buffer = []
+        self.first_buffered_at = None
+        start = time.perf_counter()
+        try:
+            # the connection context manager commits, or rolls back this batch only
+            with self.connection:
+                self.connection.executemany(self.query, batch)
+        except sqlite3.Error as e:
+            self.last_error = e
+            self.failed_flushes += 1
+            self.rows_failed += len(batch)
+            raise
+        finally:
+            self.last_flush_latency = time.perf_counter() - start
+            self.total_flush_time += self.last_flush_latency
+        self.flush_count += 1
+        self.rows_written += len(batch)
+        return len(batch)
+
+    @property
+    def rows_per_sec(self):
+        """ rows written per second of time spent flushing """
+        if not self.total_flush_time:
+            return 0.0
+        return self.rows_written / self.total_flush_time
+
+    def stats(self):
+        return {
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "rows_buffered": len(self.buffer),
+            "flush_count": self.flush_count,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_latency": self.last_flush_latency,
+            "avg_flush_latency": (
+                self.total_flush_time / (self.flush_count + self.failed_flushes)
+                if self.flush_count or self.failed_flushes else 0.0
+            ),
+            "rows_per_sec": self.rows_per_sec,
+            "last_error": self.last_error,
+        }
+
+
+# Example usage: insert users in batches of 100 and print the counters
+if __name__ == "__main__":
+    with BulkWriter("users.db", "users", ("name", "email", "age"),
+                    max_rows=100) as writer:
+        for i in range(1000):
+            writer.add((f"user{i}", f"user{i}@example.com", 20 + i % 50))
+    print(writer.stats())
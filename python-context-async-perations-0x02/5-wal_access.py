@@ -0,0 +1,235 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+# sentinel pushed on the write queue to stop the writer thread
+_STOP = object()
+
+
+# Single-writer / multi-reader access layer for one SQLite file in WAL mode.
+# Reads run on a pool of read-only connections (one per pool thread), writes are
+# queued to one dedicated writer thread so they never fight over the write lock.
+class SQLiteAccessLayer():
+    def __init__(self, db_name, readers=4, busy_timeout=5.0, write_queue_size=0):
+        self.db_name = db_name
+        self.readers = readers
+        self.busy_timeout = busy_timeout
+        self.write_queue = queue.Queue(maxsize=write_queue_size)
+        self.reader_pool = None
+        self.writer_thread = None
+        self.local = threading.local()
+        self.reader_connections = []
+        self.reader_lock = threading.Lock()
+        self.closed = True
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+        # propagate exception if needed
+        return False
+
+    async def __aenter__(self):
+        # open() waits for the writer thread to connect
+        return await asyncio.get_running_loop().run_in_executor(None, self.open)
+
+    async def __aexit__(self, exception_type, exception_value, traceback):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+        return False
+
+    def open(self):
+        if not self.closed:
+            return self
+        # the writer connection switches the file to WAL, which is persistent
+        ready = Future()
+        self.writer_thread = threading.Thread(
+            target=self._writer_loop, args=(ready,),
+            name="sqlite-writer", daemon=True
+        )
+        self.writer_thread.start()
+        # raise here if the file cannot be opened for writing
+        ready.result()
+        self.reader_pool = ThreadPoolExecutor(
+            max_workers=self.readers, thread_name_prefix="sqlite-reader"
+        )
+        self.closed = False
+        return self
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # let queued writes drain before stopping the writer
+        self.write_queue.put(_STOP)
+        self.writer_thread.join()
+        self.reader_pool.shutdown(wait=True)
+        with self.reader_lock:
+            for connection in self.reader_connections:
+                connection.close()
+            self.reader_connections.clear()
+
+    # connections
+
+    def connect_writer(self):
+        connection = sqlite3.connect(self.db_name, timeout=self.busy_timeout)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable across application crashes in WAL mode
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def connect_reader(self, check_same_thread=True):
+        # open the file read-only so a reader can never take the write lock
+        connection = sqlite3.connect(
+            f"file:{self.db_name}?mode=ro", uri=True,
+            timeout=self.busy_timeout, check_same_thread=check_same_thread
+        )
+        connection.execute("PRAGMA query_only=ON")
+        return connection
+
+    def _reader_connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.connect_reader(check_same_thread=False)
+            self.local.connection = connection
+            with self.reader_lock:
+                self.reader_connections.append(connection)
+        return connection
+
+    # writer thread
+
+    def _writer_loop(self, ready):
+        try:
+            connection = self.connect_writer()
+        except sqlite3.Error as e:
+            ready.set_exception(e)
+            return
+        ready.set_result(None)
+        try:
+            while True:
+                item = self.write_queue.get()
+                if item is _STOP:
+                    break
+                operation, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    # one transaction per queued operation
+                    with connection:
+                        result = operation(connection)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            connection.close()
+
+    def _submit_write(self, operation):
+        if self.closed:
+            raise sqlite3.ProgrammingError("access layer is closed")
+        future = Future()
+        self.write_queue.put((operation, future))
+        return future
+
+    async def _asubmit_write(self, operation):
+        """ _submit_write that waits off the event loop while the queue is full """
+        if self.closed:
+            raise sqlite3.ProgrammingError("access layer is closed")
+        future = Future()
+        try:
+            self.write_queue.put_nowait((operation, future))
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.write_queue.put, (operation, future)
+            )
+        return future
+
+    def _submit_read(self, operation):
+        if self.closed:
+            raise sqlite3.ProgrammingError("access layer is closed")
+        return self.reader_pool.submit(
+            lambda: operation(self._reader_connection())
+        )
+
+    # operations
+
+    @staticmethod
+    def _read(query, params):
+        def operation(connection):
+            cursor = connection.execute(query, params)
+            try:
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+        return operation
+
+    @staticmethod
+    def _write(query, params):
+        def operation(connection):
+            cursor = connection.execute(query, params)
+            return cursor.rowcount, cursor.lastrowid
+        return operation
+
+    @staticmethod
+    def _write_many(query, rows):
+        def operation(connection):
+            return connection.executemany(query, rows).rowcount
+        return operation
+
+    # sync interface
+
+    def read(self, query, params=()):
+        return self._submit_read(self._read(query, params)).result()
+
+    def write(self, query, params=()):
+        """ returns (rowcount, lastrowid) """
+        return self._submit_write(self._write(query, params)).result()
+
+    def write_many(self, query, rows):
+        return self._submit_write(self._write_many(query, list(rows))).result()
+
+    def transaction(self, func):
+        """ run func(connection) on the writer thread inside one transaction """
+        return self._submit_write(func).result()
+
+    # asyncio interface
+
+    async def aread(self, query, params=()):
+        return await asyncio.wrap_future(self._submit_read(self._read(query, params)))
+
+    async def awrite(self, query, params=()):
+        return await asyncio.wrap_future(
+            await self._asubmit_write(self._write(query, params))
+        )
+
+    async def awrite_many(self, query, rows):
+        return await asyncio.wrap_future(
+            await self._asubmit_write(self._write_many(query, list(rows)))
+        )
+
+    async def atransaction(self, func):
+        return await asyncio.wrap_future(await self._asubmit_write(func))
+
+
+# Example usage: concurrent reads while writes are serialized by the writer thread
+async def main():
+    async with SQLiteAccessLayer("users.db", readers=4) as db:
+        await db.awrite(
+            "CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER)"
+        )
+        await asyncio.gather(*(
+            db.awrite("INSERT INTO users (name, age) VALUES (?, ?)", (f"user{i}", 20 + i))
+            for i in range(50)
+        ))
+        all_users, older_users = await asyncio.gather(
+            db.aread("SELECT * FROM users"),
+            db.aread("SELECT * FROM users WHERE age > ?", (40,)),
+        )
+        print(len(all_users), "users,", len(older_users), "older than 40")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+SQLiteAccessLayer = __import__('5-wal_access').SQLiteAccessLayer
+
+
+# Async generator that streams the result of a query in batches.
+# The cursor lives on its own single thread (sqlite cursors are tied to the
+# thread that opened them) and at most `prefetch` batches are fetched ahead,
+# so a slow consumer never makes the whole result pile up in memory.
+async def astream_batches(db, query, params=(), batch_size=100, prefetch=2):
+    if batch_size < 1 or prefetch < 1:
+        raise ValueError("batch_size and prefetch must be at least 1")
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-stream")
+    state = {}
+    pending = collections.deque()
+
+    def open_cursor():
+        state["connection"] = db.connect_reader()
+        state["cursor"] = state["connection"].execute(query, params)
+
+    def close_cursor():
+        if "cursor" in state:
+            state["cursor"].close()
+        if "connection" in state:
+            state["connection"].close()
+
+    try:
+        await loop.run_in_executor(executor, open_cursor)
+        cursor = state["cursor"]
+        exhausted = False
+        while True:
+            # keep up to `prefetch` fetches queued behind the one being consumed
+            while not exhausted and len(pending) < prefetch:
+                pending.append(
+                    loop.run_in_executor(executor, cursor.fetchmany, batch_size)
+                )
+            if not pending:
+                break
+            rows = await pending.popleft()
+            if len(rows) < batch_size:
+                exhausted = True
+            if rows:
+                yield rows
+    finally:
+        # runs on aclose(), on cancellation and on normal exhaustion
+        for future in pending:
+            future.cancel()
+        try:
+            await loop.run_in_executor(executor, close_cursor)
+        finally:
+            executor.shutdown(wait=False)
+
+
+# Async counterpart of stream_users: yields rows one by one
+async def astream_users(db, batch_size=100, prefetch=2):
+    async for rows in astream_batches(
+        db, "SELECT * FROM users", batch_size=batch_size, prefetch=prefetch
+    ):
+        for row in rows:
+            yield row
+
+
+# Async counterpart of stream_users_in_batches: yields lists of rows
+async def astream_users_in_batches(db, batch_size=100, prefetch=2):
+    async for rows in astream_batches(
+        db, "SELECT * FROM users", batch_size=batch_size, prefetch=prefetch
+    ):
+        yield rows
+
+
+# Async counterpart of stream_user_ages: yields one age at a time
+async def astream_user_ages(db, batch_size=100, prefetch=2):
+    async for rows in astream_batches(
+        db, "SELECT age FROM users", batch_size=batch_size, prefetch=prefetch
+    ):
+        for (age,) in rows:
+            yield age
+
+
+async def acalculate_average(db):
+    total_age = 0
+    count = 0
+    # consuming the async generator
+    async for age in astream_user_ages(db):
+        total_age += age
+        count += 1
+    return total_age / count if count else 0
+
+
+# Example usage
+async def main():
+    async with SQLiteAccessLayer("users.db") as db:
+        async for user in astream_users(db, batch_size=50):
+            print(user)
+        print("average age of users:", await acalculate_average(db))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
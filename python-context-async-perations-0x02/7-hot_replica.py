@@ -0,0 +1,215 @@
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_replica_ids = itertools.count(1)
+
+
+def _memory_uri():
+    return f"file:hot_replica_{next(_replica_ids)}?mode=memory&cache=shared"
+
+
+# In-memory copy of selected read-mostly tables.
+# Each refresh fills a new shared-cache :memory: database from the file on disk
+# and then swaps it in for new reads, so readers always see a complete snapshot,
+# a refresh never writes to a database being read, and hot reads never touch the
+# filesystem. A snapshot is dropped once its last reader connection moves on.
+class HotTableReplica():
+    def __init__(self, db_name, tables=("users",), max_staleness=5.0,
+                 refresh_interval=None):
+        self.db_name = db_name
+        self.tables = tuple(tables)
+        self.max_staleness = max_staleness
+        self.refresh_interval = refresh_interval
+        # the current snapshot; anchor keeps it alive while the replica is open
+        self.uri = None
+        self.anchor = None
+        self.refreshed_at = None
+        self.stale = True
+        self.refresh_count = 0
+        self.refresh_lock = threading.Lock()
+        self.readers_lock = threading.Lock()
+        self.local = threading.local()
+        self.reader_connections = []
+        self.stop_event = threading.Event()
+        self.refresher = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+        # propagate exception if needed
+        return False
+
+    def open(self):
+        if self.anchor is not None:
+            return self
+        self.refresh()
+        if self.refresh_interval:
+            self.stop_event.clear()
+            self.refresher = threading.Thread(
+                target=self._refresh_loop, name="hot-replica-refresh", daemon=True
+            )
+            self.refresher.start()
+        return self
+
+    def close(self):
+        if self.anchor is None:
+            return
+        self.stop_event.set()
+        if self.refresher is not None:
+            self.refresher.join()
+            self.refresher = None
+        with self.readers_lock:
+            for connection in self.reader_connections:
+                connection.close()
+            self.reader_connections.clear()
+        self.local = threading.local()
+        # the in-memory copy is dropped when its last connection closes
+        with self.refresh_lock:
+            self.anchor.close()
+            self.anchor = None
+            self.uri = None
+
+    def _refresh_loop(self):
+        while not self.stop_event.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except sqlite3.Error:
+                logger.exception("hot replica refresh failed")
+
+    # refreshing
+
+    def refresh(self):
+        """ copy the selected tables from disk into a new snapshot and swap it in """
+        with self.refresh_lock:
+            uri = _memory_uri()
+            staging = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            try:
+                staging.execute(
+                    "ATTACH DATABASE ? AS src", (f"file:{self.db_name}?mode=ro",)
+                )
+                for table in self.tables:
+                    self._copy_table(staging, table)
+                staging.commit()
+                staging.execute("DETACH DATABASE src")
+            except BaseException:
+                staging.close()
+                raise
+            # new reads go to the new snapshot; reads still running on the old
+            # one keep it alive through their own connections
+            with self.readers_lock:
+                previous = self.anchor
+                self.uri, self.anchor = uri, staging
+                if previous is not None:
+                    previous.close()
+            self.refreshed_at = time.monotonic()
+            self.stale = False
+            self.refresh_count += 1
+
+    @staticmethod
+    def _copy_table(staging, table):
+        schema = staging.execute(
+            "SELECT type, sql FROM src.sqlite_master "
+            "WHERE tbl_name = ? AND sql IS NOT NULL "
+            "ORDER BY type = 'index'",
+            (table,)
+        ).fetchall()
+        if not schema:
+            raise sqlite3.OperationalError(f"no such table: {table}")
+        quoted = '"{}"'.format(table.replace('"', '""'))
+        table_sql = [sql for kind, sql in schema if kind == "table"]
+        index_sql = [sql for kind, sql in schema if kind == "index"]
+        for sql in table_sql:
+            staging.execute(sql)
+        staging.execute(f"INSERT INTO main.{quoted} SELECT * FROM src.{quoted}")
+        # build indexes after the bulk insert, it is cheaper than maintaining them
+        for sql in index_sql:
+            staging.execute(sql)
+
+    def invalidate(self):
+        """ mark the copy stale so the next read refreshes it first """
+        self.stale = True
+
+    @property
+    def age(self):
+        if self.refreshed_at is None:
+            return None
+        return time.monotonic() - self.refreshed_at
+
+    def ensure_fresh(self):
+        """ refresh now if the copy is stale or older than max_staleness """
+        if self.anchor is None:
+            raise sqlite3.ProgrammingError("replica is not open")
+        too_old = (
+            self.max_staleness is not None and self.age > self.max_staleness
+        )
+        if self.stale or too_old:
+            self.refresh()
+
+    # reading
+
+    def _connect_current(self, check_same_thread=True):
+        """ (uri, read-only connection) of the current snapshot """
+        # under readers_lock the snapshot cannot be swapped out and dropped
+        # before the connection holds it
+        with self.readers_lock:
+            uri = self.uri
+            connection = sqlite3.connect(
+                uri, uri=True, check_same_thread=check_same_thread
+            )
+        connection.execute("PRAGMA query_only=ON")
+        return uri, connection
+
+    def connect(self):
+        """ new read-only connection to the in-memory copy """
+        self.ensure_fresh()
+        return self._connect_current()[1]
+
+    def read(self, query, params=()):
+        self.ensure_fresh()
+        connection = getattr(self.local, "connection", None)
+        if connection is not None and self.local.uri != self.uri:
+            # a newer snapshot was swapped in, let go of the old one
+            with self.readers_lock:
+                self.reader_connections.remove(connection)
+            connection.close()
+            connection = None
+        if connection is None:
+            uri, connection = self._connect_current(check_same_thread=False)
+            self.local.connection, self.local.uri = connection, uri
+            with self.readers_lock:
+                self.reader_connections.append(connection)
+        # fetch everything, the connection is not held between reads
+        cursor = connection.execute(query, params)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    # write-triggered refresh
+
+    def write(self, query, params=()):
+        """ write to the file on disk, then refresh the in-memory copy """
+        connection = sqlite3.connect(self.db_name)
+        try:
+            with connection:
+                cursor = connection.execute(query, params)
+                rowcount = cursor.rowcount
+        finally:
+            connection.close()
+        self.refresh()
+        return rowcount
+
+
+# Example usage: serve the users table from memory, refreshed at most every 2s
+if __name__ == "__main__":
+    with HotTableReplica("users.db", tables=("users",), max_staleness=2.0) as replica:
+        print(replica.read("SELECT COUNT(*) FROM users"))
+        replica.write("UPDATE users SET age = age + 1 WHERE age > ?", (40,))
+        print(replica.read("SELECT * FROM users WHERE age > ?", (41,)))
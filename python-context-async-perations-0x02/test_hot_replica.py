@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Tests for the in-memory hot-table replica"""
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+HotTableReplica = __import__('7-hot_replica').HotTableReplica
+
+
+class TestHotTableReplica(unittest.TestCase):
+    """HotTableReplica against a temporary users database"""
+
+    def setUp(self):
+        """A users table with enough rows that a refresh takes a while"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_name = os.path.join(directory.name, "users.db")
+        connection = sqlite3.connect(self.db_name)
+        with connection:
+            connection.execute(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER)"
+            )
+            connection.execute("CREATE INDEX users_age ON users (age)")
+            connection.executemany(
+                "INSERT INTO users (name, age) VALUES (?, ?)",
+                ((f"user{i}", 20 + i % 50) for i in range(20000))
+            )
+        connection.close()
+
+    def test_reads_during_refresh(self):
+        """Reads keep answering from a whole snapshot while refreshes run"""
+        errors = []
+        counts = []
+        with HotTableReplica(self.db_name, max_staleness=None) as replica:
+            done = threading.Event()
+
+            def refresher():
+                try:
+                    for _ in range(10):
+                        replica.refresh()
+                finally:
+                    done.set()
+
+            def reader():
+                while not done.is_set():
+                    try:
+                        counts.append(
+                            replica.read("SELECT COUNT(*) FROM users")[0][0]
+                        )
+                    except sqlite3.Error as e:
+                        errors.append(e)
+
+            threads = [threading.Thread(target=refresher)] + [
+                threading.Thread(target=reader) for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(replica.refresh_count, 11)
+        self.assertEqual(errors, [])
+        self.assertTrue(counts)
+        self.assertEqual(set(counts), {20000})
+
+    def test_writes_are_seen_after_refresh(self):
+        """write() refreshes the copy, connect() sees the new snapshot"""
+        with HotTableReplica(self.db_name) as replica:
+            replica.write("DELETE FROM users WHERE age > ?", (30,))
+            self.assertEqual(
+                replica.read("SELECT COUNT(*) FROM users WHERE age > 30"),
+                [(0,)]
+            )
+            connection = replica.connect()
+            try:
+                self.assertEqual(
+                    connection.execute(
+                        "SELECT COUNT(*) FROM users WHERE age > 30"
+                    ).fetchall(),
+                    [(0,)]
+                )
+            finally:
+                connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()